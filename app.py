@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, render_template, request, redirect, url_for, session, flash, send_from_directory, abort, Response, jsonify
 
 from routes.auth import auth_register, auth_login, auth_logout
 
@@ -9,8 +9,9 @@ from routes.settings import *
 from routes.comments import *
 
 from utils.token import confirm_token
-from utils.decorators import login_required
+from utils.decorators import login_required, project_access_required
 from utils.socket import init_socketio  
+from utils.change_stream import start_change_stream_watcher
 
 from authlib.integrations.flask_client import OAuth
 from requests_oauthlib import OAuth2Session
@@ -19,6 +20,14 @@ from instance.api_key import *
 
 from extensions.mail import mail
 from extensions.bcrypt import bcrypt
+from utils.outbox import start_outbox_worker
+from utils.project_purge import start_purge_worker
+from utils.json_provider import init_json
+from utils.compression import init_compression
+from utils.query_profiler import init_query_profiler
+from utils.metrics import init_metrics, render_metrics
+from utils.images import MAX_AVATAR_BYTES, DEFAULT_AVATAR_SIZE, avatar_dir
+from utils.responses import wants_json
 # from extensions.captcha import recaptcha
 
 from db import users_collection as users
@@ -30,8 +39,31 @@ app = Flask(__name__)
 
 app.secret_key = SECRET_KEY
 
+# 'inprocess' for a single worker, 'mongo' to fan out across workers/nodes
+app.config['SOCKET_BUS'] = os.environ.get('SOCKET_BUS', 'inprocess')
+# Run the board and task detail queries concurrently on the async driver
+app.config['ASYNC_MONGO'] = os.environ.get('ASYNC_MONGO') == '1'
+# Board updates come from the change stream instead of the route handlers
+app.config['CHANGE_STREAM_BROADCASTS'] = os.environ.get('CHANGE_STREAM_BROADCASTS') == '1'
+# Server-Timing header plus query budget and N+1 warnings in the log
+app.config['QUERY_PROFILING'] = os.environ.get('QUERY_PROFILING') == '1'
+# Also log reply sizes (re-encodes every reply, debugging only)
+app.config['QUERY_PROFILING_BYTES'] = os.environ.get('QUERY_PROFILING_BYTES') == '1'
+app.config['QUERY_BUDGET_COUNT'] = 10
+app.config['QUERY_BUDGET_MS'] = 100
+# Bearer token Prometheus must send to /metrics; unset disables the endpoint.
+# remote_addr is no guard: behind a local reverse proxy every request is 127.0.0.1
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+init_json(app)
+init_compression(app)
+init_query_profiler(app)
+init_metrics(app)
 socketio = init_socketio(app)
 
+if app.config['CHANGE_STREAM_BROADCASTS']:
+    start_change_stream_watcher()
+
 oauth = OAuth(app)
 
 # app.config['RECAPTCHA_USE_SSL'] = True
@@ -39,16 +71,24 @@ oauth = OAuth(app)
 # app.config['RECAPTCHA_SECRET_KEY'] = CAPTCHA_SECRET_KEY
 
 app.config['UPLOAD_FOLDER'] = 'static/uploads'
-app.config['MAIL_SERVER'] = 'smtp.gmail.com'
-app.config['MAIL_PORT'] = 587
+# Leaves room for the multipart overhead around a MAX_AVATAR_BYTES image
+app.config['MAX_CONTENT_LENGTH'] = MAX_AVATAR_BYTES + 1024 * 1024
+app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+app.config['BCRYPT_LOG_ROUNDS'] = 12
+app.config['PASSWORD_HASH_WORKERS'] = 4
+app.config['MAIL_SERVER'] = os.environ.get('MAIL_SERVER', 'smtp.gmail.com')
+app.config['MAIL_PORT'] = int(os.environ.get('MAIL_PORT', 587))
 app.config['MAIL_USERNAME'] = DEL_EMAIL
 app.config['MAIL_PASSWORD'] = DEL_PASSWORD
-app.config['MAIL_USE_TLS'] = True
+app.config['MAIL_USE_TLS'] = os.environ.get('MAIL_USE_TLS', '1') == '1'
 app.config['MAIL_USE_SSL'] = False
 app.config['MAIL_DEFAULT_SENDER'] = DEL_EMAIL
 app.config['MAIL_DEBUG'] = True 
 
 mail.init_app(app)
+bcrypt.init_app(app)
+start_outbox_worker(app)
+start_purge_worker()
 # recaptcha.init_app(app)
 
 google = oauth.register(
@@ -201,26 +241,37 @@ def create_project():
 
 @app.route('/projects/<project_id>')
 @login_required
+@project_access_required()
 def view_project(project_id):
     return project_view(project_id)
 
+@app.route('/projects/<project_id>/changes')
+@login_required
+@project_access_required(api=True)
+def project_changes_since(project_id):
+    return project_changes(project_id)
+
 @app.route('/projects/<project_id>/members')
 @login_required
+@project_access_required()
 def view_members(project_id):
     return project_view_members(project_id)
 
 @app.route('/projects/<project_id>/add-member', methods=['GET', 'POST'])
 @login_required
+@project_access_required(role='owner')
 def add_member_to_project(project_id):
     return project_add_member(project_id)
 
 @app.route('/projects/<project_id>/remove-member', methods=['POST'])
 @login_required
+@project_access_required(role='owner')
 def remove_member_from_project(project_id):
     return project_remove_member(project_id)
 
 @app.route('/projects/<project_id>/columns/create', methods=['POST'])
 @login_required
+@project_access_required()
 def create_column(project_id):
     return column_create(project_id)
 
@@ -234,45 +285,87 @@ def tasks():
 
 @app.route('/projects/<project_id>/tasks/create', methods=['POST'])
 @login_required
+@project_access_required()
 def create_task(project_id):
     return task_create(project_id)
 
 @app.route('/projects/<project_id>/tasks/move', methods=['POST'])
 @login_required
+@project_access_required(api=True)
 def move_task(project_id):
     return task_move(project_id)
 
+@app.route('/projects/<project_id>/tasks/move-batch', methods=['POST'])
+@login_required
+@project_access_required(api=True)
+def move_tasks_batch(project_id):
+    return task_move_batch(project_id)
+
 @app.route('/projects/<project_id>/tasks/<task_id>/delete', methods=['POST'])
 @login_required
+@project_access_required()
 def delete_task(project_id, task_id):
     return task_delete(project_id, task_id)
 
 @app.route('/projects/<project_id>/tasks/<task_id>/edit', methods=['GET', 'POST'])
 @login_required
+@project_access_required()
 def edit_task(project_id, task_id):
     return task_update(project_id, task_id)
 
 @app.route('/projects/<project_id>/tasks/<task_id>/detail', methods=['GET'])
 @login_required
+@project_access_required(api=True)
 def view_task_detail(project_id, task_id):
     return task_view_detail(project_id, task_id)
 
 @app.route('/projects/<project_id>/delete', methods=['GET'])
 @login_required
+@project_access_required(role='owner')
 def confirm_delete_project(project_id):
     return project_delete_confirm(project_id)
 
 @app.route('/projects/<project_id>/delete', methods=['POST'])
 @login_required
+@project_access_required(role='owner')
 def delete_project(project_id):
     return project_delete(project_id)
 
+# The project is already hidden, so only the job's owner check applies here
+@app.route('/projects/<project_id>/deletion', methods=['GET'])
+@login_required
+def project_deletion(project_id):
+    return project_deletion_status(project_id)
+
 # ====== PROFILE ROUTES ======
 @login_required
 @app.route('/profile', methods=['GET', 'POST'])
 def profile():
     return view_profile()
 
+@app.route('/avatars/<digest>/<int:size>.jpg')
+def avatar(digest, size):
+    # Content addressed, so a given URL never changes
+    if not all(c in '0123456789abcdef' for c in digest):
+        abort(404)
+    response = send_from_directory(
+        avatar_dir(app.config['UPLOAD_FOLDER'], digest),
+        f'{size}.jpg',
+        max_age=31536000
+    )
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
+@app.errorhandler(413)
+def upload_too_large(e):
+    if wants_json():
+        return jsonify({'success': False, 'message': 'Request is too large'}), 413
+    # Only the avatar upload form sends files
+    if request.endpoint == 'profile':
+        flash(f"Image is larger than {MAX_AVATAR_BYTES // (1024 * 1024)} MB", "danger")
+        return redirect(url_for('profile'))
+    return e
+
 # ====== END OF PROFILE ROUTES ======
 
 # ====== SETTINGS ROUTES ======
@@ -282,24 +375,41 @@ def settings():
     return view_settings()
 # ====== END OF SETTINGS ROUTES ======
 
+# ====== METRICS ======
+
+@app.route('/metrics')
+def metrics():
+    token = app.config.get('METRICS_TOKEN')
+    if not token:
+        abort(404)
+    if request.headers.get('Authorization') != f'Bearer {token}':
+        abort(401)
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+# ====== END OF METRICS ======
+
 # ====== COMMENT ROUTES ======
 @app.route('/projects/<project_id>/tasks/<task_id>/comments', methods=['GET'])
 @login_required
+@project_access_required(api=True)
 def get_comments(project_id, task_id):
     return comment_list(project_id, task_id)
 
 @app.route('/projects/<project_id>/tasks/<task_id>/comments/create', methods=['POST'])
 @login_required
+@project_access_required(api=True)
 def add_comment(project_id, task_id):
     return comment_create(project_id, task_id)
 
 @app.route('/projects/<project_id>/tasks/<task_id>/comments/<comment_id>/edit', methods=['PUT'])
 @login_required
+@project_access_required(api=True)
 def update_comment(project_id, task_id, comment_id):
     return comment_update(project_id, task_id, comment_id)
 
 @app.route('/projects/<project_id>/tasks/<task_id>/comments/<comment_id>/delete', methods=['DELETE'])
 @login_required
+@project_access_required(api=True)
 def delete_comment(project_id, task_id, comment_id):
     return comment_delete(project_id, task_id, comment_id)
 
@@ -315,6 +425,8 @@ def inject_user():
     if raw_profile:
         if raw_profile.startswith("http"):
             profile_url = raw_profile
+        elif raw_profile.startswith("avatars/"):
+            profile_url = url_for('avatar', digest=raw_profile.split('/')[1], size=DEFAULT_AVATAR_SIZE)
         else:
             profile_url = url_for('static', filename=f'uploads/{raw_profile}')
     else:
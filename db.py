@@ -1,15 +1,28 @@
 from pymongo import MongoClient
 
-client = MongoClient("mongodb://localhost:27017/")
+from utils.query_profiler import query_profiler
+from utils.metrics import pool_metrics
 
-db = client["kanban_app"]
+MONGO_URI = "mongodb://localhost:27017/"
+DB_NAME = "kanban_app"
+
+client = MongoClient(MONGO_URI, event_listeners=[query_profiler, pool_metrics])
+
+db = client[DB_NAME]
 
 users_collection = db["users"]
 projects_collection = db["projects"]
 
 column_collection = db["columns"]
-column_collection.create_index([("project", 1), ("order", 1)])
 
 tasks_collection = db["tasks"]
 
-comments_collection = db["comments"]
\ No newline at end of file
+comments_collection = db["comments"]
+
+recent_views_collection = db["recent_views"]
+
+outbox_collection = db["outbox"]
+
+tombstones_collection = db["tombstones"]
+
+jobs_collection = db["jobs"]
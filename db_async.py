@@ -0,0 +1,28 @@
+"""Async access to the same database as db.py, for ASYNC_MONGO mode.
+
+Uses pymongo's AsyncMongoClient (pymongo >= 4.10). The client is bound to
+the event loop run by utils.aio, so only use it from coroutines handed to
+utils.aio.run_async().
+"""
+from db import MONGO_URI, DB_NAME
+
+_client = None
+
+
+def async_db():
+    global _client
+
+    if _client is None:
+        from pymongo import AsyncMongoClient
+        _client = AsyncMongoClient(MONGO_URI)
+    return _client[DB_NAME]
+
+
+async def find_list(collection, query, projection=None, sort=None):
+    cursor = collection.find(query, projection, sort=sort)
+    return await cursor.to_list(None)
+
+
+async def aggregate_list(collection, pipeline):
+    cursor = await collection.aggregate(pipeline)
+    return await cursor.to_list(None)
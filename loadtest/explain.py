@@ -0,0 +1,198 @@
+"""Benchmark the route queries and check their plans.
+
+For each dataset size, seeds a fresh loadtest dataset (see loadtest.seed),
+applies the indexes from schema.py, then runs the queries behind
+projects_list, project_view and project_view_members, built by the same
+functions the routes use. For each query it records:
+
+- median and p95 time over --repeat runs
+- documents examined and returned, and the ratio between them
+- the plan stages and indexes used, from explain('executionStats')
+
+The exit status is 1 when any query does a collection scan or examines
+more than --max-ratio documents per document returned, so an index or
+pipeline change can be checked with:
+
+    python -m loadtest.explain --sizes 50,500,2000
+    python -m loadtest.explain --sizes 200 --output plans.json
+
+The seeded data is removed afterwards unless --keep is given.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+
+from db import db
+from schema import ensure_indexes
+from routes.projects import projects_query, PROJECTS_SORT, board_pipeline, members_pipeline
+from loadtest.seed import seed, clean
+
+DEFAULT_SIZES = '50,500,2000'
+DEFAULT_MAX_RATIO = 2.0
+# Below this many documents examined the ratio is noise, not a regression
+MIN_EXAMINED = 50
+
+
+def route_queries(user_id, project_id):
+    """(name, collection, kind, spec) for every query checked."""
+    return [
+        ('projects_list', 'projects', 'find', {'filter': projects_query(user_id), 'sort': dict(PROJECTS_SORT)}),
+        ('projects_list recent views', 'recent_views', 'find',
+         {'filter': {'user_id': str(user_id)}, 'sort': {'viewed_at': -1}, 'limit': 50}),
+        ('project_view board', 'columns', 'aggregate', {'pipeline': board_pipeline(project_id)}),
+        ('project_view_members', 'projects', 'aggregate', {'pipeline': members_pipeline(project_id)}),
+    ]
+
+
+def _run(collection, kind, spec):
+    if kind == 'find':
+        cursor = db[collection].find(spec['filter'], sort=list(spec['sort'].items()), limit=spec.get('limit', 0))
+        return list(cursor)
+    return list(db[collection].aggregate(spec['pipeline']))
+
+
+def _explain(collection, kind, spec):
+    if kind == 'find':
+        command = {'find': collection, **spec}
+    else:
+        command = {'aggregate': collection, 'pipeline': spec['pipeline'], 'cursor': {}}
+    return db.command({'explain': command, 'verbosity': 'executionStats'})
+
+
+def _returned(documents):
+    # Joined documents count as returned too
+    total = len(documents)
+    for document in documents:
+        for value in document.values():
+            if isinstance(value, list) and value and isinstance(value[0], dict):
+                total += len(value)
+    return total
+
+
+def summarize_plan(explain):
+    """Stages, indexes, docs examined and collection scans found anywhere in an explain."""
+    summary = {'stages': [], 'indexes': set(), 'examined': 0, 'collscans': 0}
+
+    def walk(node):
+        if isinstance(node, list):
+            for item in node:
+                walk(item)
+            return
+        if not isinstance(node, dict):
+            return
+
+        stage = node.get('stage')
+        if stage:
+            summary['stages'].append(stage)
+            if stage == 'COLLSCAN':
+                summary['collscans'] += 1
+            # A $lookup pushed down to the query engine without a usable index
+            if stage == 'EQ_LOOKUP' and node.get('strategy') == 'NestedLoopJoin':
+                summary['collscans'] += 1
+        if node.get('indexName'):
+            summary['indexes'].add(node['indexName'])
+        # Unpushed $lookup stages report their own totals
+        if 'collectionScans' in node:
+            summary['collscans'] += node['collectionScans']
+        for used in node.get('indexesUsed', []):
+            summary['indexes'].add(used)
+        if 'totalDocsExamined' in node:
+            summary['examined'] += node['totalDocsExamined']
+
+        for key, value in node.items():
+            if key not in ('allPlansExecution', 'rejectedPlans'):
+                walk(value)
+
+    walk(explain)
+    summary['indexes'] = sorted(summary['indexes'])
+    return summary
+
+
+def check_query(name, collection, kind, spec, repeat, max_ratio):
+    documents = _run(collection, kind, spec)
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        _run(collection, kind, spec)
+        timings.append((time.perf_counter() - started) * 1000)
+    timings.sort()
+
+    plan = summarize_plan(_explain(collection, kind, spec))
+    returned = _returned(documents)
+    ratio = plan['examined'] / max(returned, 1)
+
+    problems = []
+    if plan['collscans']:
+        problems.append(f"{plan['collscans']} collection scan(s)")
+    if plan['examined'] >= MIN_EXAMINED and ratio > max_ratio:
+        problems.append(f"examined/returned {ratio:.1f} > {max_ratio}")
+
+    return {
+        'query': name,
+        'collection': collection,
+        'median_ms': statistics.median(timings),
+        'p95_ms': timings[min(len(timings) - 1, int(0.95 * len(timings)))],
+        'returned': returned,
+        'examined': plan['examined'],
+        'ratio': ratio,
+        'indexes': plan['indexes'],
+        'stages': plan['stages'],
+        'problems': problems
+    }
+
+
+def run(sizes, users=20, projects=3, columns=4, repeat=20, max_ratio=DEFAULT_MAX_RATIO, keep=False):
+    ensure_indexes(db)
+    results = []
+    try:
+        for size in sizes:
+            clean()
+            manifest = seed(users=users, projects=projects, columns=columns, tasks=size, comments=0, members=5)
+            user = manifest['users'][0]
+            project_id = user['projects'][0]['project_id']
+
+            for name, collection, kind, spec in route_queries(user['user_id'], project_id):
+                result = check_query(name, collection, kind, spec, repeat, max_ratio)
+                result['tasks_per_project'] = size
+                results.append(result)
+    finally:
+        if not keep:
+            clean()
+    return results
+
+
+def print_report(results):
+    print(f"{'tasks':>6} {'query':<28} {'median':>8} {'p95':>8} {'examined':>9} {'returned':>9} {'ratio':>6}  indexes")
+    for result in results:
+        print(f"{result['tasks_per_project']:>6} {result['query']:<28} {result['median_ms']:>7.2f}ms "
+              f"{result['p95_ms']:>7.2f}ms {result['examined']:>9} {result['returned']:>9} {result['ratio']:>6.2f}  "
+              f"{', '.join(result['indexes']) or '-'}")
+        for problem in result['problems']:
+            print(f"{'':>6} FAIL {problem}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default=DEFAULT_SIZES, help='comma separated tasks per project')
+    parser.add_argument('--users', type=int, default=20)
+    parser.add_argument('--projects', type=int, default=3, help='projects per user')
+    parser.add_argument('--columns', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--max-ratio', type=float, default=DEFAULT_MAX_RATIO)
+    parser.add_argument('--keep', action='store_true', help='leave the last dataset in place')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    results = run(
+        [int(size) for size in args.sizes.split(',')],
+        args.users, args.projects, args.columns, args.repeat, args.max_ratio, args.keep
+    )
+    print_report(results)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+
+    sys.exit(1 if any(result['problems'] for result in results) else 0)
@@ -0,0 +1,290 @@
+"""Drive a running app with a realistic Kanban traffic mix.
+
+Needs a dataset from loadtest.seed and the app running against the same
+database. Each virtual user logs in as a seeded user and loops over a
+weighted mix of page views, board JSON calls and writes; optional
+Socket.IO clients (pip install "python-socketio[client]") join project
+rooms and count the board events they receive.
+
+    python -m loadtest.seed
+    python app.py
+    python -m loadtest.run --users 20 --sockets 50 --duration 60 --output before.json
+    ... change something ...
+    python -m loadtest.run --users 20 --sockets 50 --duration 60 --compare before.json
+
+Reports requests, errors, throughput and p50/p95/p99 latency per route.
+"""
+import argparse
+import json
+import random
+import subprocess
+import threading
+import time
+from collections import defaultdict
+
+import requests
+
+from loadtest.seed import LOADTEST_TITLE_PREFIX
+
+DEFAULT_MIX = 'dashboard=15,board=25,tasks=10,detail=15,comments=15,move=10,create=5,comment=5'
+JSON_HEADERS = {'Accept': 'application/json'}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, route, seconds, ok):
+        with self.lock:
+            self.latencies[route].append(seconds)
+            if not ok:
+                self.errors[route] += 1
+
+    def summary(self, elapsed):
+        routes = {}
+        for route, values in sorted(self.latencies.items()):
+            values = sorted(values)
+            routes[route] = {
+                'requests': len(values),
+                'errors': self.errors.get(route, 0),
+                'rps': len(values) / elapsed,
+                'p50_ms': percentile(values, 0.50) * 1000,
+                'p95_ms': percentile(values, 0.95) * 1000,
+                'p99_ms': percentile(values, 0.99) * 1000
+            }
+        return routes
+
+
+class VirtualUser:
+    def __init__(self, base_url, user, password, recorder, rng):
+        self.base_url = base_url.rstrip('/')
+        self.user = user
+        self.password = password
+        self.recorder = recorder
+        self.rng = rng
+        self.http = requests.Session()
+
+    def _call(self, route, method, path, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = self.http.request(method, self.base_url + path, allow_redirects=False, timeout=30, **kwargs)
+            ok = response.status_code < 400
+        except requests.RequestException:
+            response, ok = None, False
+        self.recorder.record(route, time.perf_counter() - started, ok)
+        return response
+
+    def login(self):
+        response = self._call('POST /login', 'POST', '/login', data={
+            'email': self.user['email'],
+            'password': self.password
+        })
+        # A successful login redirects; a failed one re-renders the form
+        return response is not None and response.status_code in (301, 302, 303)
+
+    def _project(self):
+        return self.rng.choice(self.user['projects'])
+
+    def dashboard(self):
+        self._call('GET /dashboard', 'GET', '/dashboard')
+
+    def board(self):
+        self._call('GET /projects/<id>', 'GET', f"/projects/{self._project()['project_id']}")
+
+    def tasks(self):
+        self._call('GET /tasks', 'GET', '/tasks')
+
+    def detail(self):
+        project = self._project()
+        if project['tasks']:
+            task = self.rng.choice(project['tasks'])
+            self._call('GET task detail', 'GET',
+                       f"/projects/{project['project_id']}/tasks/{task['task_id']}/detail")
+
+    def comments(self):
+        project = self._project()
+        if project['tasks']:
+            task = self.rng.choice(project['tasks'])
+            self._call('GET comments', 'GET',
+                       f"/projects/{project['project_id']}/tasks/{task['task_id']}/comments")
+
+    def move(self):
+        project = self._project()
+        if not project['tasks']:
+            return
+        task = self.rng.choice(project['tasks'])
+        target = self.rng.choice(project['columns'])
+        response = self._call('POST task move', 'POST', f"/projects/{project['project_id']}/tasks/move", json={
+            'taskId': task['task_id'],
+            'sourceColumnId': task['column_id'],
+            'targetColumnId': target
+        })
+        if response is not None and response.ok:
+            task['column_id'] = target
+
+    def create(self):
+        project = self._project()
+        self._call('POST task create', 'POST', f"/projects/{project['project_id']}/tasks/create",
+                   headers=JSON_HEADERS, data={
+                       'title': f'{LOADTEST_TITLE_PREFIX} task {self.rng.randint(0, 10 ** 6)}',
+                       'description': 'Created by loadtest.run',
+                       'priority': self.rng.choice(['low', 'medium', 'high']),
+                       'column_id': self.rng.choice(project['columns'])
+                   })
+
+    def comment(self):
+        project = self._project()
+        if project['tasks']:
+            task = self.rng.choice(project['tasks'])
+            self._call('POST comment', 'POST',
+                       f"/projects/{project['project_id']}/tasks/{task['task_id']}/comments/create",
+                       json={'comment': 'Load test comment'})
+
+
+def _parse_mix(mix):
+    weights = {}
+    for part in mix.split(','):
+        name, _, weight = part.partition('=')
+        weights[name.strip()] = float(weight or 1)
+    return weights
+
+
+def _run_user(vuser, weights, deadline, think_time):
+    if not vuser.login():
+        print(f"Login failed for {vuser.user['email']}")
+        return
+    actions = list(weights)
+    action_weights = [weights[action] for action in actions]
+    while time.monotonic() < deadline:
+        getattr(vuser, vuser.rng.choices(actions, action_weights)[0])()
+        if think_time:
+            time.sleep(vuser.rng.uniform(0, think_time))
+
+
+def _run_socket(base_url, user, password, project_id, deadline, received, lock):
+    import socketio
+
+    http = requests.Session()
+    http.post(f"{base_url}/login", data={'email': user['email'], 'password': password}, allow_redirects=False)
+    cookie = '; '.join(f'{name}={value}' for name, value in http.cookies.items())
+
+    client = socketio.Client(reconnection=False)
+
+    @client.on('*')
+    def on_event(event, data=None):
+        with lock:
+            received[event] += 1
+
+    try:
+        client.connect(base_url, headers={'Cookie': cookie}, transports=['websocket'])
+        client.call('join_project', {'project_id': project_id}, timeout=10)
+        while time.monotonic() < deadline and client.connected:
+            client.sleep(0.5)
+    except Exception as e:
+        print(f"Socket client error: {e}")
+    finally:
+        if client.connected:
+            client.disconnect()
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], text=True).strip()
+    except Exception:
+        return None
+
+
+def run(base_url, manifest, users=10, sockets=0, duration=30, mix=DEFAULT_MIX, think_time=0.0, random_seed=1):
+    weights = _parse_mix(mix)
+    recorder = Recorder()
+    deadline = time.monotonic() + duration
+    received = defaultdict(int)
+    received_lock = threading.Lock()
+    threads = []
+
+    for index in range(users):
+        user = manifest['users'][index % len(manifest['users'])]
+        vuser = VirtualUser(base_url, user, manifest['password'], recorder, random.Random(random_seed + index))
+        threads.append(threading.Thread(target=_run_user, args=(vuser, weights, deadline, think_time), daemon=True))
+
+    for index in range(sockets):
+        user = manifest['users'][index % len(manifest['users'])]
+        project_id = user['projects'][index % len(user['projects'])]['project_id']
+        threads.append(threading.Thread(
+            target=_run_socket,
+            args=(base_url, user, manifest['password'], project_id, deadline, received, received_lock),
+            daemon=True
+        ))
+
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(duration + 60)
+    elapsed = time.monotonic() - started
+
+    routes = recorder.summary(elapsed)
+    return {
+        'commit': _git_commit(),
+        'users': users,
+        'sockets': sockets,
+        'duration': elapsed,
+        'mix': mix,
+        'total_rps': sum(route['rps'] for route in routes.values()),
+        'routes': routes,
+        'socket_events': dict(received)
+    }
+
+
+def print_report(result, baseline=None):
+    print(f"commit {result['commit']}  {result['users']} users  {result['sockets']} sockets  "
+          f"{result['duration']:.1f}s  {result['total_rps']:.1f} req/s")
+    print(f"{'route':<22} {'reqs':>7} {'err':>5} {'req/s':>8} {'p50':>8} {'p95':>8} {'p99':>8}")
+    for route, stats in result['routes'].items():
+        line = (f"{route:<22} {stats['requests']:>7} {stats['errors']:>5} {stats['rps']:>8.1f} "
+                f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+        before = (baseline or {}).get('routes', {}).get(route)
+        if before and before['p95_ms']:
+            line += f"   p95 {(stats['p95_ms'] / before['p95_ms'] - 1) * 100:+.0f}% vs {baseline['commit']}"
+        print(line)
+    if result['socket_events']:
+        print(f"socket events received: {result['socket_events']}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--base-url', default='http://localhost:5000')
+    parser.add_argument('--manifest', default='loadtest/dataset.json')
+    parser.add_argument('--users', type=int, default=10, help='concurrent virtual users')
+    parser.add_argument('--sockets', type=int, default=0, help='concurrent Socket.IO clients')
+    parser.add_argument('--duration', type=float, default=30, help='seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX)
+    parser.add_argument('--think-time', type=float, default=0.0, help='max seconds between a user\'s requests')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the result as JSON')
+    parser.add_argument('--compare', help='a previous --output to compare p95 against')
+    args = parser.parse_args()
+
+    with open(args.manifest) as f:
+        manifest = json.load(f)
+
+    result = run(args.base_url, manifest, args.users, args.sockets, args.duration, args.mix, args.think_time, args.seed)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(result, baseline)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
@@ -0,0 +1,231 @@
+"""Synthetic Kanban dataset for load tests and benchmarks.
+
+Bulk inserts users, projects (with their counters already filled in),
+columns, tasks and comments into the app's database, and writes a manifest
+of what it created for loadtest.run to drive traffic against. Every
+seeded document carries loadtest: True. A re-run (or --clean) removes the
+previous dataset together with everything written into its projects since
+(tasks and comments created by loadtest.run, recent views, tombstones and
+purge jobs) and leaves real data alone.
+
+    python -m loadtest.seed --users 50 --projects 3 --tasks 200 --comments 3
+    python -m loadtest.seed --clean
+
+The same --seed always produces the same titles, dates and shapes, so
+results from different commits are comparable.
+"""
+import argparse
+import json
+import random
+import re
+from datetime import datetime, timedelta
+
+import bcrypt
+from bson import ObjectId
+
+from db import (users_collection, projects_collection, column_collection, tasks_collection, comments_collection,
+                recent_views_collection, tombstones_collection, jobs_collection)
+
+LOADTEST_PASSWORD = 'Loadtest#2024'
+# Starts the title of every task loadtest.run creates
+LOADTEST_TITLE_PREFIX = '[loadtest]'
+COLUMN_LABELS = ['To Do', 'In Progress', 'Review', 'Done']
+COLUMN_COLORS = ['light-blue', 'yellow', 'purple', 'green']
+PRIORITIES = ['low', 'medium', 'high']
+TASK_TYPES = ['task', 'bug', 'feature']
+LABELS = ['backend', 'frontend', 'api', 'ui', 'infra', 'docs']
+WORDS = ('update refactor fix review deploy test migrate design document profile board '
+         'column comment login signup cache index query socket email avatar').split()
+
+INSERT_BATCH = 1000
+MANIFEST_TASKS_PER_PROJECT = 50
+DEFAULT_MANIFEST = 'loadtest/dataset.json'
+
+# (collection, field holding the project id) for data written inside seeded projects
+PROJECT_DATA = (
+    (comments_collection, 'project_id'),
+    (tasks_collection, 'project_id'),
+    (column_collection, 'project'),
+    (tombstones_collection, 'project_id'),
+    (recent_views_collection, 'project_id'),
+    (jobs_collection, 'project_id'),
+)
+
+
+def _sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def _insert(collection, documents):
+    for start in range(0, len(documents), INSERT_BATCH):
+        collection.insert_many(documents[start:start + INSERT_BATCH], ordered=False)
+
+
+def clean():
+    project_ids = projects_collection.distinct('_id', {'loadtest': True})
+    for collection, field in PROJECT_DATA:
+        result = collection.delete_many({'$or': [{field: {'$in': project_ids}}, {'loadtest': True}]})
+        print(f"Removed {result.deleted_count} from {collection.name}")
+
+    # Left behind if a project was purged before the clean
+    result = tasks_collection.delete_many({'title': {'$regex': f'^{re.escape(LOADTEST_TITLE_PREFIX)}'}})
+    if result.deleted_count:
+        print(f"Removed {result.deleted_count} stray load test tasks")
+
+    for collection in (projects_collection, users_collection):
+        result = collection.delete_many({'loadtest': True})
+        print(f"Removed {result.deleted_count} from {collection.name}")
+
+
+def seed(users=50, projects=3, columns=4, tasks=200, comments=3, members=3, random_seed=42):
+    """Insert the dataset and return its manifest."""
+    rng = random.Random(random_seed)
+    now = datetime.now()
+    # One hash for every user: bcrypt per user would dominate seeding time
+    password_hash = bcrypt.hashpw(LOADTEST_PASSWORD.encode(), bcrypt.gensalt(12)).decode()
+
+    user_docs = []
+    for index in range(users):
+        user_docs.append({
+            '_id': ObjectId(),
+            'firstname': f'Load{index}',
+            'lastname': 'Tester',
+            'email': f'loadtest{index}@example.com',
+            'password': password_hash,
+            'email_verified': True,
+            'loadtest': True
+        })
+
+    project_docs, column_docs, task_docs, comment_docs = [], [], [], []
+    manifest = {'password': LOADTEST_PASSWORD, 'seed': random_seed, 'users': []}
+
+    for user in user_docs:
+        user_id = str(user['_id'])
+        user_entry = {'email': user['email'], 'user_id': user_id, 'projects': []}
+
+        for project_index in range(projects):
+            project_id = ObjectId()
+            others = rng.sample(user_docs, min(members, len(user_docs)))
+            member_ids = [user['_id']] + [other['_id'] for other in others if other['_id'] != user['_id']]
+
+            project_columns = []
+            for order in range(columns):
+                project_columns.append({
+                    '_id': ObjectId(),
+                    'project': project_id,
+                    'label': COLUMN_LABELS[order] if order < len(COLUMN_LABELS) else f'Column {order + 1}',
+                    'color': COLUMN_COLORS[order % len(COLUMN_COLORS)],
+                    'order': order,
+                    'created_at': now,
+                    'revision': 0,
+                    'loadtest': True
+                })
+            column_docs.extend(project_columns)
+            done_column = next((c for c in project_columns if c['label'] == 'Done'), None)
+
+            column_counts = {}
+            project_tasks = []
+            for task_index in range(tasks):
+                column = rng.choice(project_columns)
+                column_counts[str(column['_id'])] = column_counts.get(str(column['_id']), 0) + 1
+                assignee = rng.choice(member_ids)
+                comment_count = rng.randint(0, comments * 2) if comments else 0
+                created_at = now - timedelta(days=rng.randint(0, 90), minutes=rng.randint(0, 1440))
+                task = {
+                    '_id': ObjectId(),
+                    'title': _sentence(rng, 4),
+                    'description': _sentence(rng, 16),
+                    'type': rng.choice(TASK_TYPES),
+                    'priority': rng.choice(PRIORITIES),
+                    'due_date': now + timedelta(days=rng.randint(-30, 60)) if rng.random() < 0.7 else None,
+                    'labels': rng.sample(LABELS, rng.randint(0, 3)),
+                    'column_id': column['_id'],
+                    'project_id': project_id,
+                    'created_by': user_id,
+                    'assigned_to': str(assignee),
+                    'assignee_name': 'Load Tester',
+                    'assignee_initials': 'LT',
+                    'status': 'todo',
+                    'created_at': created_at,
+                    'updated_at': created_at,
+                    'order': (task_index + 1) * 65536,
+                    'comment_count': comment_count,
+                    'revision': 0,
+                    'loadtest': True
+                }
+                project_tasks.append(task)
+
+                for comment_index in range(comment_count):
+                    commented_at = created_at + timedelta(minutes=comment_index + 1)
+                    author = rng.choice(member_ids)
+                    comment_docs.append({
+                        'task_id': task['_id'],
+                        'project_id': project_id,
+                        'user_id': str(author),
+                        'user_name': 'Load Tester',
+                        'comment': _sentence(rng, 12),
+                        'created_at': commented_at,
+                        'updated_at': commented_at,
+                        'edited': False,
+                        'loadtest': True
+                    })
+            task_docs.extend(project_tasks)
+
+            project_docs.append({
+                '_id': project_id,
+                'project_name': f'Load project {user["firstname"]}-{project_index}',
+                'description': _sentence(rng, 10),
+                'color': rng.choice(COLUMN_COLORS),
+                'user_id': user_id,
+                'members': member_ids,
+                'created_at': now - timedelta(days=rng.randint(0, 365)),
+                'updated_at': now,
+                'status': 'active',
+                'progress': 0,
+                'task_count': len(project_tasks),
+                'done_count': column_counts.get(str(done_column['_id']), 0) if done_column else 0,
+                'done_column_id': done_column['_id'] if done_column else None,
+                'column_counts': column_counts,
+                'revision': 0,
+                'loadtest': True
+            })
+
+            user_entry['projects'].append({
+                'project_id': str(project_id),
+                'columns': [str(column['_id']) for column in project_columns],
+                'tasks': [
+                    {'task_id': str(task['_id']), 'column_id': str(task['column_id'])}
+                    for task in project_tasks[:MANIFEST_TASKS_PER_PROJECT]
+                ]
+            })
+
+        manifest['users'].append(user_entry)
+
+    for collection, documents in ((users_collection, user_docs), (projects_collection, project_docs),
+                                  (column_collection, column_docs), (tasks_collection, task_docs),
+                                  (comments_collection, comment_docs)):
+        _insert(collection, documents)
+        print(f"Inserted {len(documents)} into {collection.name}")
+
+    return manifest
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--users', type=int, default=50)
+    parser.add_argument('--projects', type=int, default=3, help='projects per user')
+    parser.add_argument('--columns', type=int, default=4, help='columns per project')
+    parser.add_argument('--tasks', type=int, default=200, help='tasks per project')
+    parser.add_argument('--comments', type=int, default=3, help='average comments per task')
+    parser.add_argument('--members', type=int, default=3, help='extra members per project')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--manifest', default=DEFAULT_MANIFEST)
+    parser.add_argument('--clean', action='store_true', help='only remove the previous dataset')
+    args = parser.parse_args()
+
+    clean()
+    if not args.clean:
+        manifest = seed(args.users, args.projects, args.columns, args.tasks, args.comments, args.members, args.seed)
+        with open(args.manifest, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        print(f"Manifest written to {args.manifest}")
@@ -6,10 +6,8 @@ from utils.auth_checker import validate_email, validate_password
 from utils.token import generate_confirmation_token
 from functools import wraps
 
-from flask_mail import Message
-
-from extensions.bcrypt import bcrypt
-from extensions.mail import mail
+from utils.passwords import hash_password, check_password, needs_rehash
+from utils.outbox import enqueue_email
 # from extensions.captcha import recaptcha
 
 def auth_register():
@@ -42,7 +40,7 @@ def auth_register():
             return render_template('/auth/register.html')
         
         try:
-            hashed_password = bcrypt.generate_password_hash(password)
+            hashed_password = hash_password(password)
             user_data = {
                 'firstname': fname,
                 'lastname': lname,
@@ -60,28 +58,26 @@ def auth_register():
                 
                 confirm_url = url_for('confirm_email', token=token, _external=True)
                 try:
-                    msg = Message(
+                    enqueue_email(
                         subject="Confirm Your Email - KanFlow",
                         sender=current_app.config['MAIL_USERNAME'],
-                        recipients=[email]
-                    )
-                    msg.html = f"""
+                        recipients=[email],
+                        html=f"""
                     <h2>Hi {fname},</h2>
                     <p>Please confirm your email by clicking the link below:</p>
                     <p><a href="{confirm_url}" style="background-color: #007bff; color: white; padding: 10px 20px; text-decoration: none; border-radius: 5px;">Confirm Email</a></p>
                     <p>Or copy and paste this URL in your browser:</p>
                     <p>{confirm_url}</p>
                     <p>If you did not sign up, please ignore this message.</p>
-                    """
-                    
-                    msg.body = f"Hi {fname},\n\nPlease confirm your email by clicking the link below:\n{confirm_url}\n\nIf you did not sign up, ignore this message."
-                    mail.send(msg)
+                    """,
+                        body=f"Hi {fname},\n\nPlease confirm your email by clicking the link below:\n{confirm_url}\n\nIf you did not sign up, ignore this message."
+                    )
                     
                     flash('A confirmation email has been sent. Please check your inbox.', 'info')
                     return redirect(url_for('login'))
                     
                 except Exception as email_error:
-                    print(f"Email sending error: {email_error}")
+                    print(f"Email queueing error: {email_error}")
                     flash('Registration successful, but email could not be sent. Contact support for email verification.', 'warning')
                     return redirect(url_for('login'))
             
@@ -103,10 +99,16 @@ def auth_login():
         try:
             user = users.find_one({'email': email})
             
-            if user and bcrypt.check_password_hash(user['password'], password):
+            if user and check_password(user.get('password'), password):
                 if not user.get('email_verified', False):
                     flash('Please confirm your email before logging in.', 'warning')
                     return render_template('/auth/login.html')
+
+                if needs_rehash(user['password']):
+                    users.update_one(
+                        {'_id': user['_id'], 'password': user['password']},
+                        {'$set': {'password': hash_password(password)}}
+                    )
                 
                 session['user_id'] = str(user['_id'])
                 session['name'] = f"{user['firstname']} {user['lastname']}"
@@ -1,7 +1,14 @@
-from flask import request, session, jsonify
+from flask import request, session, jsonify, Response, stream_with_context
 from bson import ObjectId
 from datetime import datetime
-from db import comments_collection, tasks_collection, projects_collection
+from itertools import chain
+from db import comments_collection, tasks_collection
+from utils.revisions import next_revision, release_revision
+from utils.json_provider import dumps
+from utils.responses import document_etag, is_not_modified, not_modified_response, with_validators
+
+# Fields a comment is returned with by the JSON endpoints
+COMMENT_FIELDS = ('_id', 'user_name', 'user_id', 'comment', 'created_at', 'edited')
 
 def comment_create(project_id, task_id):
     try:
@@ -21,17 +28,6 @@ def comment_create(project_id, task_id):
         if not task:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
         
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
-        })
-        
-        if not project:
-            return jsonify({'success': False, 'message': 'Access denied'}), 403
-        
         comment = {
             'task_id': ObjectId(task_id),
             'project_id': ObjectId(project_id),
@@ -46,17 +42,17 @@ def comment_create(project_id, task_id):
         result = comments_collection.insert_one(comment)
         comment['_id'] = result.inserted_id
 
+        revision = next_revision(project_id)
+        tasks_collection.update_one(
+            {'_id': ObjectId(task_id)},
+            {'$inc': {'comment_count': 1}, '$set': {'revision': revision}}
+        )
+        release_revision(project_id, revision)
+
         return jsonify({
             'success': True,
             'message': 'Comment added successfully',
-            'comment': {
-                '_id': str(comment['_id']),
-                'user_name': comment['user_name'],
-                'user_id': comment['user_id'],
-                'comment': comment['comment'],
-                'created_at': comment['created_at'].isoformat(),
-                'edited': comment['edited']
-            }
+            'comment': {field: comment[field] for field in COMMENT_FIELDS}
         })
         
     except Exception as e:
@@ -64,42 +60,124 @@ def comment_create(project_id, task_id):
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
 
+COMMENTS_PAGE_SIZE = 20
+MAX_COMMENTS_PAGE_SIZE = 100
+
+
+def _comment_cursor(comment):
+    return f"{comment['created_at'].isoformat()}_{comment['_id']}"
+
+
+def _parse_comment_cursor(cursor):
+    """Return (created_at, _id) for a cursor, or None if it is malformed."""
+    try:
+        created_at, comment_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(created_at), ObjectId(comment_id)
+    except Exception:
+        return None
+
+
+def _normalized_cursor(parsed):
+    return f"{parsed[0].isoformat()}_{parsed[1]}" if parsed else ''
+
+
 def comment_list(project_id, task_id):
+    """Newest first, keyset paginated on (created_at, _id).
+
+    ?before=<cursor> returns the page after a previous response's next_cursor,
+    ?since=<cursor> only returns comments newer than the given one, and
+    ?limit= sets the page size (capped at MAX_COMMENTS_PAGE_SIZE).
+    """
     try:
         user_id = session.get('user_id')
 
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
-        })
-        
-        if not project:
-            return jsonify({'success': False, 'message': 'Access denied'}), 403
-        
-        comments = list(comments_collection.find(
-            {'task_id': ObjectId(task_id)},
-            sort=[('created_at', -1)]
-        ))
-
-        formatted_comments = []
-        for comment in comments:
-            formatted_comments.append({
-                '_id': str(comment['_id']),
-                'user_name': comment['user_name'],
-                'user_id': comment['user_id'],
-                'comment': comment['comment'],
-                'created_at': comment['created_at'].isoformat(),
-                'edited': comment.get('edited', False),
-                'can_edit': comment['user_id'] == user_id
-            })
-        
-        return jsonify({
-            'success': True,
-            'comments': formatted_comments
-        })
+        try:
+            limit = min(max(int(request.args.get('limit', COMMENTS_PAGE_SIZE)), 1), MAX_COMMENTS_PAGE_SIZE)
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid limit'}), 400
+
+        query = {'task_id': ObjectId(task_id), 'project_id': ObjectId(project_id)}
+        bounds = []
+
+        before = request.args.get('before')
+        if before:
+            before = _parse_comment_cursor(before)
+            if not before:
+                return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+            created_at, comment_id = before
+            bounds.append({'$or': [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, '_id': {'$lt': comment_id}}
+            ]})
+
+        since = request.args.get('since')
+        if since:
+            since = _parse_comment_cursor(since)
+            if not since:
+                return jsonify({'success': False, 'message': 'Invalid cursor'}), 400
+            created_at, comment_id = since
+            bounds.append({'$or': [
+                {'created_at': {'$gt': created_at}},
+                {'created_at': created_at, '_id': {'$gt': comment_id}}
+            ]})
+
+        # Comment writes bump the task's revision; can_edit depends on the user
+        task = tasks_collection.find_one(
+            {'_id': ObjectId(task_id), 'project_id': ObjectId(project_id)},
+            {'revision': 1, 'updated_at': 1}
+        )
+        if not task:
+            return jsonify({'success': False, 'message': 'Task not found'}), 404
+
+        # Each page is its own representation; the parsed cursors ignore formatting
+        etag = document_etag(
+            task_id, task.get('revision', 0), task.get('updated_at', 0), user_id,
+            _normalized_cursor(before), _normalized_cursor(since), limit
+        )
+        if is_not_modified(etag):
+            return not_modified_response(etag)
+
+        if bounds:
+            query['$and'] = bounds
+
+        cursor = comments_collection.find(
+            query,
+            {field: 1 for field in COMMENT_FIELDS},
+            sort=[('created_at', -1), ('_id', -1)],
+            limit=limit + 1,
+            batch_size=limit + 1
+        )
+        # Run the query before streaming starts, so a failing query is still a 500
+        first = next(cursor, None)
+
+        def generate():
+            # Written piece by piece straight off the Mongo cursor
+            yield '{"success": true, "comments": ['
+            last = None
+            count = 0
+            has_more = False
+            try:
+                for comment in (chain([first], cursor) if first else ()):
+                    if count == limit:
+                        has_more = True
+                        break
+                    comment.setdefault('edited', False)
+                    comment['can_edit'] = comment['user_id'] == user_id
+                    yield (',' if count else '') + dumps(comment)
+                    last = comment
+                    count += 1
+            except Exception as e:
+                # Re-raise so the connection drops mid-body: a cleanly closed
+                # list would look like a complete page to the client
+                print(f"Comment list stream error: {e}")
+                raise
+            finally:
+                cursor.close()
+
+            next_cursor = _comment_cursor(last) if has_more and last else None
+            yield '], "next_cursor": ' + dumps(next_cursor) + '}'
+
+        return with_validators(Response(stream_with_context(generate()), mimetype='application/json'), etag)
         
     except Exception as e:
         print(f"Comment list error: {e}")
@@ -136,6 +214,12 @@ def comment_update(project_id, task_id, comment_id):
         )
         
         if result.modified_count > 0:
+            revision = next_revision(project_id)
+            tasks_collection.update_one(
+                {'_id': ObjectId(task_id)},
+                {'$set': {'revision': revision}}
+            )
+            release_revision(project_id, revision)
             return jsonify({
                 'success': True,
                 'message': 'Comment updated successfully'
@@ -164,6 +248,12 @@ def comment_delete(project_id, task_id, comment_id):
         result = comments_collection.delete_one({'_id': ObjectId(comment_id)})
         
         if result.deleted_count > 0:
+            revision = next_revision(project_id)
+            tasks_collection.update_one(
+                {'_id': ObjectId(task_id)},
+                {'$inc': {'comment_count': -1}, '$set': {'revision': revision}}
+            )
+            release_revision(project_id, revision)
             return jsonify({
                 'success': True,
                 'message': 'Comment deleted successfully'
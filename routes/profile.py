@@ -1,11 +1,10 @@
 from db import users_collection
-from flask import request, flash, redirect, url_for, session, jsonify, render_template, current_app
+from flask import request, flash, redirect, url_for, session, jsonify, render_template
 from bson import ObjectId
 from datetime import datetime
-import os
-from extensions.bcrypt import bcrypt
+from utils.passwords import hash_password, check_password
 from utils.auth_checker import allowed_file, validate_password
-from werkzeug.utils import secure_filename
+from utils.images import save_avatar, avatar_path, ImageTooLarge, InvalidImage
 
 def view_profile():
     user_id = session.get('user_id')
@@ -19,16 +18,17 @@ def view_profile():
         if 'profile' in request.files:
             image = request.files['profile']
             if image and allowed_file(image.filename):
-                filename = secure_filename(image.filename)
-                image_path = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-                image.save(image_path)
-
-                users_collection.update_one(
-                    {'_id': ObjectId(user_id)},
-                    {'$set': {'picture': filename}}
-                )
-                session['picture'] = filename
-                flash("Profile picture updated!", "success")
+                try:
+                    picture = avatar_path(save_avatar(image))
+                except (ImageTooLarge, InvalidImage) as e:
+                    flash(str(e), "danger")
+                else:
+                    users_collection.update_one(
+                        {'_id': ObjectId(user_id)},
+                        {'$set': {'picture': picture}}
+                    )
+                    session['picture'] = picture
+                    flash("Profile picture updated!", "success")
         # ==== Update Info ====
         elif action == 'update_info':
             firstname = request.form['firstname']
@@ -61,14 +61,14 @@ def view_profile():
 
             user = users_collection.find_one({'_id': ObjectId(user_id)})
 
-            if not bcrypt.check_password_hash(user['password'], current_pw):
+            if not check_password(user.get('password'), current_pw):
                 flash("Current password is incorrect!", "danger")
             elif new_pw != confirm_pw:
                 flash("New passwords do not match!", "danger")
             elif not validate_password(new_pw):
                 flash("Password does not meet security requirements!", "warning")
             else:
-                hashed_pw = bcrypt.generate_password_hash(new_pw).decode('utf-8')
+                hashed_pw = hash_password(new_pw)
                 users_collection.update_one(
                     {'_id': ObjectId(user_id)},
                     {'$set': {'password': hashed_pw}}
@@ -2,122 +2,100 @@ from db import projects_collection as projects_collection
 from db import column_collection as column_collection
 from db import tasks_collection as tasks_collection
 from db import users_collection as users_collection
+from db_async import async_db, aggregate_list
 
 from utils.socket import broadcast_to_project, get_socketio
+from utils.counters import project_progress, column_added
+from utils.recent_views import record_view, last_viewed_by_project
+from utils.access import current_project, invalidate_project, PROJECT_EXCLUDED_FIELDS
+from utils.aio import async_mongo_enabled, run_async
+from utils.responses import board_response
+from utils.revisions import next_revision, release_revision, current_watermark, changes_since
+from utils.project_purge import NOT_DELETED, schedule_project_deletion, purge_status
 
-from flask import request, flash, render_template, redirect, url_for, session, jsonify
+from flask import request, flash, render_template, redirect, url_for, session, jsonify, g
+
+import asyncio
 
 from bson import ObjectId
 from datetime import datetime
 
+# Route queries are built here so loadtest.explain checks exactly what the routes run
+PROJECTS_SORT = [('created_at', -1)]
+
+
+def projects_query(user_id):
+    return {
+        **NOT_DELETED,
+        '$or': [
+            {'user_id': user_id},
+            {'members': ObjectId(user_id)}
+        ]
+    }
+
+
+def board_pipeline(project_id):
+    """Columns of a project in order, each with its tasks in rank order."""
+    return [
+        {'$match': {'project': ObjectId(project_id)}},
+        {'$lookup': {
+            'from': 'tasks',
+            'let': {'column_id': '$_id'},
+            'pipeline': [
+                {
+                    '$match': {
+                        '$expr': {
+                            '$and': [
+                                {'$eq': ['$column_id', '$$column_id']},
+                                {'$eq': ['$project_id', ObjectId(project_id)]}
+                            ]
+                        }
+                    }
+                },
+                {'$sort': {'order': 1, '_id': 1}}
+            ],
+            'as': 'tasks'
+        }},
+        {'$addFields': {
+            'task_count': {'$size': '$tasks'}
+        }},
+        {'$sort': {'order': 1}}
+    ]
+
+
+def members_pipeline(project_id):
+    return [
+        {'$match': {'_id': ObjectId(project_id), **NOT_DELETED}},
+        {'$lookup': {
+            'from': 'users',
+            'localField': 'members',
+            'foreignField': '_id',
+            'as': 'member_details'
+        }},
+        {'$project': {
+            'project_name': 1,
+            'description': 1,
+            'user_id': 1,
+            'member_details': {
+                '_id': 1,
+                'firstname': 1,
+                'lastname': 1,
+                'email': 1,
+                'picture': 1
+            }
+        }}
+    ]
+
 def projects_list(template):
     try:
         user_id = session.get('user_id')
-        pipeline = [
-            {
-                '$match': {
-                    '$or': [
-                        {'user_id': user_id},
-                        {'members': ObjectId(user_id)}
-                    ]
-                }
-            },
-            {
-                '$lookup': {
-                    'from': 'tasks',
-                    'localField': '_id',
-                    'foreignField': 'project_id',
-                    'as': 'tasks'
-                }
-            },
-            {
-                '$lookup': {
-                    'from': 'columns',
-                    'localField': '_id',
-                    'foreignField': 'project',
-                    'as': 'columns'
-                }
-            },
-            {
-                '$addFields': {
-                    'total_tasks': {'$size': '$tasks'},
-                    'done_column': {
-                        '$arrayElemAt': [
-                            {
-                                '$filter': {
-                                    'input': '$columns',
-                                    'as': 'col',
-                                    'cond': {'$eq': ['$$col.label', 'Done']}
-                                }
-                            },
-                            0
-                        ]
-                    }
-                }
-            },
-            {
-                '$addFields': {
-                    'completed_tasks': {
-                        '$size': {
-                            '$filter': {
-                                'input': '$tasks',
-                                'as': 'task',
-                                'cond': {
-                                    '$eq': ['$$task.column_id', '$done_column._id']
-                                }
-                            }
-                        }
-                    }
-                }
-            },
-            {
-                '$addFields': {
-                    'progress': {
-                        '$cond': {
-                            'if': {'$gt': ['$total_tasks', 0]},
-                            'then': {
-                                '$round': [
-                                    {'$multiply': [
-                                        {'$divide': ['$completed_tasks', '$total_tasks']},
-                                        100
-                                    ]},
-                                    0
-                                ]
-                            },
-                            'else': 0
-                        }
-                    },
-                    'member_count': {
-                        '$add': [
-                            {'$size': {'$ifNull': ['$members', []]}}
-                        ]
-                    },
-                    'status': {
-                        '$switch': {
-                            'branches': [
-                                {
-                                    'case': {'$eq': ['$total_tasks', 0]},
-                                    'then': 'not-started'
-                                },
-                                {
-                                    'case': {'$eq': ['$completed_tasks', '$total_tasks']},
-                                    'then': 'completed'
-                                },
-                                {
-                                    'case': {'$gt': ['$completed_tasks', 0]},
-                                    'then': 'in-progress'
-                                }
-                            ],
-                            'default': 'not-started'
-                        }
-                    }
-                }
-            },
-            {'$sort': {'created_at': -1}}
-        ]
-        
-        projects = list(projects_collection.aggregate(pipeline))
+        projects = list(projects_collection.find(projects_query(user_id), sort=PROJECTS_SORT))
+        last_viewed = last_viewed_by_project(user_id)
         for project in projects:
+            project_progress(project)
+            project['member_count'] = len(project.get('members', []))
+            project['last_viewed'] = last_viewed.get(project['_id'])
+
             if 'created_at' in project:
                 project['formatted_date'] = project['created_at'].strftime('%b %d, %Y')
             else:
@@ -134,7 +112,13 @@ def projects_list(template):
             }
             project['color_class'] = color_map.get(project.get('color', 'blue'), 'color-blue')
         
-        return render_template(f'/main/{template}.html', projects=projects)
+        recent_projects = sorted(
+            (project for project in projects if project['last_viewed']),
+            key=lambda project: project['last_viewed'],
+            reverse=True
+        )
+
+        return render_template(f'/main/{template}.html', projects=projects, recent_projects=recent_projects)
         
     except Exception as e:
         print(f"Projects list error: {e}")
@@ -159,7 +143,8 @@ def project_create():
         try:
             existing_project = projects_collection.find_one({
                 'project_name': project_name,
-                'user_id': user_id
+                'user_id': user_id,
+                **NOT_DELETED
             })
             
             if existing_project:
@@ -175,7 +160,10 @@ def project_create():
                 'created_at': datetime.now(),
                 'updated_at': datetime.now(),
                 'status': 'active',
-                'progress': 0
+                'progress': 0,
+                'task_count': 0,
+                'done_count': 0,
+                'column_counts': {}
             }
             
             result = projects_collection.insert_one(project_data)
@@ -194,74 +182,43 @@ def project_create():
     
     return render_template('/main/create_project.html')
 
+async def _load_board(project_id, columns_pipeline, load_project):
+    """The columns (with tasks) and, unless the request already has it, the project, fetched concurrently."""
+    db = async_db()
+    queries = [aggregate_list(db.columns, columns_pipeline)]
+    if load_project:
+        queries.append(db.projects.find_one({'_id': ObjectId(project_id), **NOT_DELETED}, PROJECT_EXCLUDED_FIELDS))
+    return await asyncio.gather(*queries)
+
 def project_view(project_id):
     try:
         user_id = session.get('user_id')
-        
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
-        })
-        
+        columns_pipeline = board_pipeline(project_id)
+        # Read before the board, so /changes from here covers anything written meanwhile
+        revision = current_watermark(project_id)
+
+        if async_mongo_enabled():
+            # A role cache miss has already loaded the project
+            load_project = 'project' not in g
+            columns, *project = run_async(_load_board(project_id, columns_pipeline, load_project))
+            if load_project:
+                g.project = project[0]
+
+        project = current_project()
+
         if not project:
             flash('Project not found or you do not have access to it.', 'error')
             return redirect(url_for('projects'))
 
-        projects_collection.update_one(
-            {'_id': ObjectId(project_id)},
-            {
-                '$set': {
-                    f'last_viewed.{user_id}': datetime.now()
-                }
-            }
-        )
+        record_view(user_id, project['_id'])
 
-        # Fixed aggregation pipeline
-        columns_pipeline = [
-            {'$match': {'project': ObjectId(project_id)}},
-            {'$lookup': {
-                'from': 'tasks',
-                'let': {'column_id': '$_id'},
-                'pipeline': [
-                    {
-                        '$match': {
-                            '$expr': {
-                                '$and': [
-                                    {'$eq': ['$column_id', '$$column_id']},
-                                    {'$eq': ['$project_id', ObjectId(project_id)]}
-                                ]
-                            }
-                        }
-                    },
-                    {'$lookup': {
-                        'from': 'comments',
-                        'localField': '_id',
-                        'foreignField': 'task_id',
-                        'as': 'comments'
-                    }},
-                    {'$addFields': {
-                        'comment_count': {'$size': '$comments'}
-                    }},
-                    {'$project': {
-                        'comments': 0  # Remove comments array, keep only count
-                    }}
-                ],
-                'as': 'tasks'
-            }},
-            {'$addFields': {
-                'task_count': {'$size': '$tasks'}
-            }},
-            {'$sort': {'order': 1}}
-        ]
-        
-        columns = list(column_collection.aggregate(columns_pipeline))
+        if not async_mongo_enabled():
+            columns = list(column_collection.aggregate(columns_pipeline))
         
         return render_template('/main/project_detail.html', 
                              project=project, 
-                             columns=columns)
+                             columns=columns,
+                             revision=revision)
         
     except Exception as e:
         print(f"Project view error: {e}")
@@ -275,17 +232,10 @@ def column_create(project_id):
             color = request.form.get('color', 'light-blue').strip()
             user_id = session.get('user_id')
 
-            project = projects_collection.find_one({
-                '_id': ObjectId(project_id),
-                '$or': [
-                    {'user_id': user_id},
-                    {'members': ObjectId(user_id)}
-                ]
-            })
+            project = current_project()
             
             if not project:
-                flash('Project not found or you do not have access to it.', 'error')
-                return redirect(url_for('projects'))
+                return board_response(project_id, 'Project not found or you do not have access to it.', 'error', 404, redirect_to=url_for('projects'))
 
             existing_column = column_collection.find_one({
                 'project': ObjectId(project_id),
@@ -293,8 +243,7 @@ def column_create(project_id):
             })
             
             if existing_column:
-                flash('A column with this name already exists in this project.', 'error')
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, 'A column with this name already exists in this project.', 'error', 409)
             
             last_column = column_collection.find_one(
                 {'project': ObjectId(project_id)},
@@ -302,17 +251,23 @@ def column_create(project_id):
             )
             next_order = (last_column.get('order', -1) + 1) if last_column else 0
                         
+            revision = next_revision(project_id)
+
             column_data = {
                 'label': label,
                 'color': color,
                 'project': ObjectId(project_id),
                 'created_at': datetime.now(),
                 'created_by': user_id,
-                'order': next_order
+                'order': next_order,
+                'revision': revision
             }
 
             result = column_collection.insert_one(column_data)
+            watermark = release_revision(project_id, revision)
             if result.inserted_id:
+                column_added(project, result.inserted_id, label)
+
                 socketio = get_socketio()
                 if socketio:
                     column_data_broadcast = {
@@ -335,19 +290,30 @@ def column_create(project_id):
                         }
                     )
                 
-                flash('Column created successfully!', 'success')
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, 'Column created successfully!', 'success', revision=watermark, column=column_data)
             else:
-                flash('Failed to create column. Please try again.', 'error')
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, 'Failed to create column. Please try again.', 'error', 500)
         
         return redirect(url_for('view_project', project_id=project_id))
         
     except Exception as e:
         print(f"Column creation error: {e}")
-        flash('An error occurred while creating the column.', 'error')
-        return redirect(url_for('view_project', project_id=project_id))
+        return board_response(project_id, 'An error occurred while creating the column.', 'error', 500)
     
+def project_changes(project_id):
+    try:
+        try:
+            since = int(request.args.get('since', 0))
+        except ValueError:
+            return jsonify({'success': False, 'message': 'Invalid revision'}), 400
+
+        changes = changes_since(project_id, since)
+        return jsonify({'success': True, 'since': since, **changes})
+
+    except Exception as e:
+        print(f"Project changes error: {e}")
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
 def project_view_members(project_id):
     try:
         user_id = session.get('user_id')
@@ -356,41 +322,13 @@ def project_view_members(project_id):
             flash('Invalid project ID.', 'error')
             return redirect(url_for('projects'))
         
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
-        })
+        project = current_project()
 
         if not project:
             flash('Project not found or you do not have access to it.', 'error')
             return redirect(url_for('projects'))
 
-        members_pipeline = [
-            {'$match': {'_id': ObjectId(project_id)}},
-            {'$lookup': {
-                'from': 'users',
-                'localField': 'members',
-                'foreignField': '_id',
-                'as': 'member_details'
-            }},
-            {'$project': {
-                'project_name': 1,
-                'description': 1,
-                'user_id': 1,
-                'member_details': {
-                    '_id': 1,
-                    'firstname': 1,
-                    'lastname': 1,
-                    'email': 1,
-                    'picture': 1
-                }
-            }}
-        ]
-        
-        result = list(projects_collection.aggregate(members_pipeline))
+        result = list(projects_collection.aggregate(members_pipeline(project_id)))
         
         if not result:
             flash('Project not found.', 'error')
@@ -422,10 +360,7 @@ def project_remove_member(project_id):
             flash('Invalid project ID.', 'error')
             return redirect(url_for('projects'))
         
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            'user_id': user_id
-        })
+        project = current_project()
 
         if not project:
             flash('Project not found or you do not have permission to manage it.', 'error')
@@ -451,6 +386,7 @@ def project_remove_member(project_id):
                 '$set': {'updated_at': datetime.now()}
             }
         )
+        invalidate_project(project_id, member_id)
         
         if result.modified_count > 0:
             member = users_collection.find_one({'_id': ObjectId(member_id)})
@@ -491,10 +427,7 @@ def project_add_member(project_id):
             flash('Invalid project ID.', 'error')
             return redirect(url_for('projects'))
         
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            'user_id': user_id
-        })
+        project = current_project()
 
         if not project:
             flash('Project not found or you do not have permission to manage it.', 'error')
@@ -525,6 +458,7 @@ def project_add_member(project_id):
                     '$set': {'updated_at': datetime.now()}
                 }
             )
+            invalidate_project(project_id, member_object_id)
             
             if result.modified_count > 0:
                 flash(f'Successfully added {member["firstname"]} {member["lastname"]} to the project!', 'success')
@@ -560,10 +494,7 @@ def project_delete_confirm(project_id):
     try:
         user_id = session.get('user_id')
         
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            'user_id': user_id
-        })
+        project = current_project()
         
         if not project:
             flash('Project not found or you do not have permission to delete it.', 'error')
@@ -587,21 +518,18 @@ def project_delete_confirm(project_id):
 def project_delete(project_id):
     try:
         user_id = session.get('user_id')
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            'user_id': user_id
-        })
+        project = current_project()
         
         if not project:
             flash('Project not found or you do not have permission to delete it. Only the project owner can delete projects.', 'error')
             return redirect(url_for('projects'))
         
         project_name = project.get('project_name', 'Unknown Project')
-        tasks_result = tasks_collection.delete_many({'project_id': ObjectId(project_id)})
-        columns_result = column_collection.delete_many({'project': ObjectId(project_id)})
-        project_result = projects_collection.delete_one({'_id': ObjectId(project_id)})
-        
-        if project_result.deleted_count > 0:
+
+        # Hidden right away; tasks, comments and columns are purged in the background
+        if schedule_project_deletion(project_id, user_id):
+            invalidate_project(project_id)
+
             socketio = get_socketio()
             if socketio:
                 broadcast_to_project(
@@ -616,8 +544,8 @@ def project_delete(project_id):
                         'timestamp': datetime.now().isoformat()
                     }
                 )
-            
-            flash(f'Project "{project_name}" and all associated data deleted successfully! ({tasks_result.deleted_count} tasks, {columns_result.deleted_count} columns)', 'success')
+
+            flash(f'Project "{project_name}" deleted. Its tasks and comments are being removed in the background.', 'success')
         else:
             flash('Failed to delete project.', 'error')
         
@@ -626,4 +554,20 @@ def project_delete(project_id):
     except Exception as e:
         print(f"Project delete error: {e}")
         flash('An error occurred while deleting the project.', 'error')
-        return redirect(url_for('projects'))
\ No newline at end of file
+        return redirect(url_for('projects'))
+
+def project_deletion_status(project_id):
+    """Progress of a project's background purge, for the user who deleted it."""
+    job = purge_status(project_id) if ObjectId.is_valid(project_id) else None
+
+    if not job or job.get('user_id') != session.get('user_id'):
+        return jsonify({'success': False, 'message': 'No deletion in progress for this project'}), 404
+
+    return jsonify({
+        'success': True,
+        'status': job['status'],
+        'phase': job['phase'],
+        'deleted': job.get('deleted', {}),
+        'created_at': job.get('created_at'),
+        'completed_at': job.get('completed_at')
+    })
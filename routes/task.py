@@ -1,62 +1,176 @@
-from db import projects_collection, column_collection, tasks_collection, users_collection
+from db import column_collection, tasks_collection, users_collection
+from db_async import async_db, find_list
 from utils.socket import broadcast_to_project, get_socketio
-from flask import request, flash, redirect, url_for, session, jsonify, render_template
+from utils.counters import task_added, task_removed, task_moved, tasks_moved
+from utils.ranking import (append_rank, parse_rank, placement_rank, rank_between, rebalance_placements,
+                           resolve_rank)
+from utils.access import current_project, PROJECT_EXCLUDED_FIELDS
+from utils.aio import async_mongo_enabled, run_async
+from utils.responses import board_response, document_etag, is_not_modified, not_modified_response, with_validators
+from utils.revisions import claim_revision, next_revision, release_revision, record_deletion
+from utils.project_purge import NOT_DELETED, deleting_project_ids
+from flask import request, redirect, url_for, session, jsonify, render_template, g
 from bson import ObjectId
+from pymongo import ReturnDocument, UpdateOne
 from datetime import datetime, timedelta
+import asyncio
+
+TASK_BUCKETS = ('overdue', 'due_soon', 'other')
+TASKS_PAGE_SIZE = 25
+
+def _bucket_page(bucket):
+    try:
+        return max(int(request.args.get(f'{bucket}_page', 1)), 1)
+    except ValueError:
+        return 1
+
+def _bucket_facet(match, sort, page):
+    return [
+        {'$match': match},
+        {'$sort': sort},
+        {'$skip': (page - 1) * TASKS_PAGE_SIZE},
+        {'$limit': TASKS_PAGE_SIZE},
+        {'$lookup': {
+            'from': 'projects',
+            'let': {'project_id': '$project_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$_id', '$$project_id']}}},
+                {'$project': {'project_name': 1, 'color': 1}}
+            ],
+            'as': 'project'
+        }},
+        {'$lookup': {
+            'from': 'columns',
+            'let': {'column_id': '$column_id'},
+            'pipeline': [
+                {'$match': {'$expr': {'$eq': ['$_id', '$$column_id']}}},
+                {'$project': {'label': 1}}
+            ],
+            'as': 'column'
+        }},
+        {'$addFields': {
+            'project_name': {'$ifNull': [{'$arrayElemAt': ['$project.project_name', 0]}, 'Unknown Project']},
+            'project_color': {'$ifNull': [{'$arrayElemAt': ['$project.color', 0]}, '#3b82f6']},
+            'column_name': {'$ifNull': [{'$arrayElemAt': ['$column.label', 0]}, 'Unknown Column']}
+        }},
+        {'$project': {'project': 0, 'column': 0}}
+    ]
 
 def my_tasks():
     user_id = session.get('user_id')
-    
-    # Find all tasks assigned to the current user
-    tasks_cursor = tasks_collection.find({'assigned_to': user_id})
-    tasks_list = list(tasks_cursor)
-
-    enriched_tasks = []
-    for task in tasks_list:
-        # Get project details
-        project = projects_collection.find_one({'_id': task['project_id']})
-        
-        # Get column details
-        column = column_collection.find_one({'_id': task['column_id']})
-
-        # Enrich task with additional information
-        task['project_name'] = project.get('project_name', 'Unknown Project') if project else 'Unknown Project'
-        task['project_color'] = project.get('color', '#3b82f6') if project else '#3b82f6'
-        task['column_name'] = column.get('label', 'Unknown Column') if column else 'Unknown Column'
-        
-        enriched_tasks.append(task)
-    
     now = datetime.now()
-    
-    overdue_tasks = []
-    due_soon_tasks = []
-    other_tasks = []
-    
-    # Categorize tasks based on due date
-    for task in enriched_tasks:
-        due_date = task.get('due_date')
-        
-        if due_date:
-            # Make sure due_date is a datetime object
-            if isinstance(due_date, datetime):
-                if due_date < now:
-                    overdue_tasks.append(task)
-                elif due_date <= now + timedelta(days=7):
-                    due_soon_tasks.append(task)
-                else:
-                    other_tasks.append(task)
-        else:
-            other_tasks.append(task)
-    
-    # Sort tasks by due date
-    overdue_tasks.sort(key=lambda x: x.get('due_date', datetime.min))
-    due_soon_tasks.sort(key=lambda x: x.get('due_date', datetime.min))
-    
+    due_soon = now + timedelta(days=7)
+
+    bucket_matches = {
+        'overdue': {'due_date': {'$lt': now}},
+        'due_soon': {'due_date': {'$gte': now, '$lte': due_soon}},
+        'other': {'$or': [{'due_date': None}, {'due_date': {'$gt': due_soon}}]}
+    }
+    bucket_sorts = {
+        'overdue': {'due_date': 1, '_id': 1},
+        'due_soon': {'due_date': 1, '_id': 1},
+        'other': {'created_at': -1, '_id': 1}
+    }
+    pages = {bucket: _bucket_page(bucket) for bucket in TASK_BUCKETS}
+
+    # One round trip: bucket, page and enrich every section with a single $facet
+    facet = {
+        bucket: _bucket_facet(bucket_matches[bucket], bucket_sorts[bucket], pages[bucket])
+        for bucket in TASK_BUCKETS
+    }
+    facet['counts'] = [
+        {'$group': {
+            '_id': None,
+            'overdue': {'$sum': {'$cond': [{'$and': [
+                {'$eq': [{'$type': '$due_date'}, 'date']},
+                {'$lt': ['$due_date', now]}
+            ]}, 1, 0]}},
+            'due_soon': {'$sum': {'$cond': [{'$and': [
+                {'$eq': [{'$type': '$due_date'}, 'date']},
+                {'$gte': ['$due_date', now]},
+                {'$lte': ['$due_date', due_soon]}
+            ]}, 1, 0]}},
+            'other': {'$sum': {'$cond': [{'$or': [
+                {'$in': [{'$type': '$due_date'}, ['missing', 'null']]},
+                {'$and': [
+                    {'$eq': [{'$type': '$due_date'}, 'date']},
+                    {'$gt': ['$due_date', due_soon]}
+                ]}
+            ]}, 1, 0]}}
+        }}
+    ]
+
+    # Filter dropdowns list every project and priority, not just the current page's
+    facet['filters'] = [
+        {'$group': {
+            '_id': None,
+            'project_ids': {'$addToSet': '$project_id'},
+            'priorities': {'$addToSet': '$priority'},
+            'column_ids': {'$addToSet': '$column_id'}
+        }},
+        {'$lookup': {
+            'from': 'projects',
+            'localField': 'project_ids',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'project_name': 1}}],
+            'as': 'projects'
+        }},
+        {'$lookup': {
+            'from': 'columns',
+            'localField': 'column_ids',
+            'foreignField': '_id',
+            'pipeline': [{'$project': {'label': 1}}],
+            'as': 'columns'
+        }}
+    ]
+
+    match = {'assigned_to': user_id}
+    # Tasks of a deleted project linger until its purge job gets to them. The
+    # list of such projects is short and read off a partial index, and keeps
+    # the project $lookup inside the paged facets
+    deleting = deleting_project_ids()
+    if deleting:
+        match['project_id'] = {'$nin': deleting}
+
+    result = next(tasks_collection.aggregate([
+        {'$match': match},
+        {'$facet': facet}
+    ]), {})
+
+    counts = (result.get('counts') or [{}])[0]
+    pagination = {}
+    for bucket in TASK_BUCKETS:
+        total = counts.get(bucket, 0)
+        page = pages[bucket]
+        page_count = max((total + TASKS_PAGE_SIZE - 1) // TASKS_PAGE_SIZE, 1)
+        args = request.args.to_dict()
+
+        pagination[bucket] = {
+            'page': page,
+            'pages': page_count,
+            'total': total,
+            'prev_url': url_for('tasks', **{**args, f'{bucket}_page': page - 1}) if page > 1 else None,
+            'next_url': url_for('tasks', **{**args, f'{bucket}_page': page + 1}) if page < page_count else None
+        }
+
+    filters = (result.get('filters') or [{}])[0]
+    filter_projects = sorted({project['project_name'] for project in filters.get('projects', [])})
+    filter_statuses = sorted({column['label'] for column in filters.get('columns', [])})
+    filter_priorities = [priority for priority in ('high', 'medium', 'low') if priority in filters.get('priorities', [])]
+
+    overdue_tasks = result.get('overdue', [])
+    due_soon_tasks = result.get('due_soon', [])
+    other_tasks = result.get('other', [])
+
     return render_template('tasks/tasks.html', 
-                         tasks=enriched_tasks,
+                         tasks=overdue_tasks + due_soon_tasks + other_tasks,
                          overdue_tasks=overdue_tasks,
                          due_soon_tasks=due_soon_tasks,
-                         other_tasks=other_tasks)
+                         other_tasks=other_tasks,
+                         filter_projects=filter_projects,
+                         filter_priorities=filter_priorities,
+                         filter_statuses=filter_statuses,
+                         pagination=pagination)
 
 def task_create(project_id):
     try:
@@ -71,24 +185,15 @@ def task_create(project_id):
             user_id = session.get('user_id')
 
             if not title:
-                flash('Task title is required!', 'error')
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, 'Task title is required!', 'error', 400)
                 
             if not column_id:
-                flash('Column selection is required!', 'error')
-                return redirect(url_for('view_project', project_id=project_id))
-
-            project = projects_collection.find_one({
-                '_id': ObjectId(project_id),
-                '$or': [
-                    {'user_id': user_id},
-                    {'members': ObjectId(user_id)}
-                ]
-            })
+                return board_response(project_id, 'Column selection is required!', 'error', 400)
+
+            project = current_project()
             
             if not project:
-                flash('Project not found or you do not have access to it.', 'error')
-                return redirect(url_for('projects'))
+                return board_response(project_id, 'Project not found or you do not have access to it.', 'error', 404, redirect_to=url_for('projects'))
 
             column = column_collection.find_one({
                 '_id': ObjectId(column_id),
@@ -96,16 +201,14 @@ def task_create(project_id):
             })
             
             if not column:
-                flash('Invalid column selected.', 'error')
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, 'Invalid column selected.', 'error', 400)
 
             due_date = None
             if due_date_str:
                 try:
                     due_date = datetime.strptime(due_date_str, '%Y-%m-%d')
                 except ValueError:
-                    flash('Invalid due date format.', 'error')
-                    return redirect(url_for('view_project', project_id=project_id))
+                    return board_response(project_id, 'Invalid due date format.', 'error', 400)
 
             labels = []
             if labels_str:
@@ -115,11 +218,8 @@ def task_create(project_id):
             assignee_name = f"{user_info.get('firstname', '')} {user_info.get('lastname', '')}".strip()
             assignee_initials = ''.join([name[0].upper() for name in assignee_name.split() if name])[:2]
 
-            last_task = tasks_collection.find_one(
-                {'column_id': ObjectId(column_id)},
-                sort=[('order', -1)]
-            )
-            next_order = (last_task.get('order', -1) + 1) if last_task else 0
+            next_order = append_rank()
+            revision = next_revision(project_id)
             
             task_data = {
                 'title': title,
@@ -137,12 +237,18 @@ def task_create(project_id):
                 'status': 'todo',
                 'created_at': datetime.now(),
                 'updated_at': datetime.now(),
-                'order': next_order
+                'order': next_order,
+                'comment_count': 0,
+                'revision': revision
             }
             
             result = tasks_collection.insert_one(task_data)
+            watermark = release_revision(
+                project_id, revision, task_added(project, column['_id']) if result.inserted_id else None
+            )
             
             if result.inserted_id:
+
                 socketio = get_socketio()
                 if socketio:
                     task_data_broadcast = {
@@ -170,103 +276,274 @@ def task_create(project_id):
                         }
                     )
                 
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, revision=watermark, task=task_data)
             else:
-                flash('Failed to create task. Please try again.', 'error')
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, 'Failed to create task. Please try again.', 'error', 500)
         
         return redirect(url_for('view_project', project_id=project_id))
         
     except Exception as e:
         print(f"Task creation error: {e}")
-        flash('An error occurred while creating the task.', 'error')
-        return redirect(url_for('view_project', project_id=project_id))
+        return board_response(project_id, 'An error occurred while creating the task.', 'error', 500)
+
+MAX_BATCH_MOVES = 200
+
+def _valid_columns(project_id, column_ids):
+    """The subset of column_ids that belong to the project.
+
+    Access is already checked by project_access_required.
+    """
+    return {
+        column['_id'] for column in column_collection.find(
+            {'_id': {'$in': [ObjectId(column_id) for column_id in column_ids]}, 'project': ObjectId(project_id)},
+            {'_id': 1}
+        )
+    }
 
 def task_move(project_id):
     try:
         data = request.get_json()
         task_id = data.get('taskId')
-        source_column_id = data.get('sourceColumnId')
         target_column_id = data.get('targetColumnId')
-        user_id = session.get('user_id')
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
-        })
-        
-        if not project:
-            return jsonify({'success': False, 'message': 'Access denied'}), 403
 
-        task = tasks_collection.find_one({
-            '_id': ObjectId(task_id),
-            'project_id': ObjectId(project_id)
-        })
-        
-        if not task:
-            return jsonify({'success': False, 'message': 'Task not found'}), 404
+        if not ObjectId.is_valid(task_id) or not ObjectId.is_valid(target_column_id):
+            return jsonify({'success': False, 'message': 'Invalid columns'}), 400
 
-        source_column = column_collection.find_one({
-            '_id': ObjectId(source_column_id),
-            'project': ObjectId(project_id)
-        })
-        
-        target_column = column_collection.find_one({
-            '_id': ObjectId(target_column_id),
-            'project': ObjectId(project_id)
-        })
-        
-        if not source_column or not target_column:
+        if ObjectId(target_column_id) not in _valid_columns(project_id, [target_column_id]):
             return jsonify({'success': False, 'message': 'Invalid columns'}), 400
 
-        last_task = tasks_collection.find_one(
-            {'column_id': ObjectId(target_column_id)},
-            sort=[('order', -1)]
+        try:
+            prev_rank = parse_rank(data.get('prevOrder'))
+            next_rank = parse_rank(data.get('nextOrder'))
+        except (TypeError, ValueError):
+            return jsonify({'success': False, 'message': 'Invalid order'}), 400
+
+        # Also returns done_column_id, so the counters need no project read
+        project = claim_revision(project_id)
+        if not project:
+            return jsonify({'success': False, 'message': 'Project not found'}), 404
+        revision = project['revision']
+
+        # Neighbour ranks come from the board, so the drop position needs no read
+        next_order = resolve_rank(
+            target_column_id,
+            prev_rank=prev_rank,
+            next_rank=next_rank,
+            prev_task_id=data.get('prevTaskId'),
+            next_task_id=data.get('nextTaskId'),
+            revision=revision
         )
-        next_order = (last_task.get('order', -1) + 1) if last_task else 0
-        update_result = tasks_collection.update_one(
-            {'_id': ObjectId(task_id)},
+        if next_order is None:
+            release_revision(project_id, revision)
+            return jsonify({'success': False, 'message': 'The column has changed, reload the board'}), 409
+
+        # The pre-image gives the real source column for the counters
+        task = tasks_collection.find_one_and_update(
+            {'_id': ObjectId(task_id), 'project_id': ObjectId(project_id)},
             {
                 '$set': {
                     'column_id': ObjectId(target_column_id),
                     'updated_at': datetime.now(),
-                    'order': next_order
+                    'order': next_order,
+                    'revision': revision
                 }
-            }
+            },
+            projection={'column_id': 1},
+            return_document=ReturnDocument.BEFORE
         )
-        
-        if update_result.modified_count > 0:
-            return jsonify({
-                'success': True,
-                'message': 'Task moved successfully',
-                'task_id': task_id,
-                'source_column_id': source_column_id,
-                'target_column_id': target_column_id
-            })
-        else:
-            return jsonify({'success': False, 'message': 'Failed to update task'}), 500
+
+        if not task:
+            release_revision(project_id, revision)
+            return jsonify({'success': False, 'message': 'Task not found'}), 404
+
+        watermark = release_revision(
+            project_id, revision, task_moved(project, task['column_id'], ObjectId(target_column_id))
+        )
+        return jsonify({
+            'success': True,
+            'message': 'Task moved successfully',
+            'task_id': task_id,
+            'source_column_id': str(task['column_id']),
+            'target_column_id': target_column_id,
+            'order': next_order,
+            'revision': watermark
+        })
             
     except Exception as e:
         print(f"Task move error: {e}")
         return jsonify({'success': False, 'message': 'Internal server error'}), 500
 
-def task_update(project_id, task_id):
+def task_move_batch(project_id):
     try:
+        data = request.get_json() or {}
+        moves = data.get('moves') or []
         user_id = session.get('user_id')
 
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
+        if not isinstance(moves, list) or not moves:
+            return jsonify({'success': False, 'message': 'No moves given'}), 400
+
+        if len(moves) > MAX_BATCH_MOVES:
+            return jsonify({'success': False, 'message': f'At most {MAX_BATCH_MOVES} moves per batch'}), 400
+
+        results = [{'taskId': move.get('taskId'), 'success': False} for move in moves]
+        well_formed = [
+            index for index, move in enumerate(moves)
+            if ObjectId.is_valid(move.get('taskId')) and ObjectId.is_valid(move.get('targetColumnId'))
+        ]
+        for index in set(range(len(moves))) - set(well_formed):
+            results[index]['message'] = 'Invalid task or column'
+
+        valid_columns = _valid_columns(project_id, {moves[index]['targetColumnId'] for index in well_formed})
+
+        task_ids = [ObjectId(moves[index]['taskId']) for index in well_formed]
+        current_columns = {
+            task['_id']: task['column_id'] for task in
+            tasks_collection.find(
+                {'_id': {'$in': task_ids}, 'project_id': ObjectId(project_id)},
+                {'column_id': 1}
+            )
+        }
+
+        drops = []
+        seen = set()
+        for index in well_formed:
+            move = moves[index]
+            task_id = ObjectId(move['taskId'])
+            target_column_id = ObjectId(move['targetColumnId'])
+
+            if task_id in seen:
+                results[index]['message'] = 'Task appears more than once in the batch'
+                continue
+            seen.add(task_id)
+
+            if target_column_id not in valid_columns:
+                results[index]['message'] = 'Invalid column'
+                continue
+            if task_id not in current_columns:
+                results[index]['message'] = 'Task not found'
+                continue
+
+            try:
+                prev_rank = parse_rank(move.get('prevOrder'))
+                next_rank = parse_rank(move.get('nextOrder'))
+            except (TypeError, ValueError):
+                results[index]['message'] = 'Invalid order'
+                continue
+
+            drops.append((index, task_id, target_column_id, prev_rank, next_rank))
+
+        if not drops:
+            return jsonify({'success': False, 'moved': 0, 'results': results}), 400
+
+        now = datetime.now()
+        project = claim_revision(project_id)
+        if not project:
+            return jsonify({'success': False, 'message': 'Project not found'}), 404
+        revision = project['revision']
+
+        # Rebalance crowded columns before placing anything, so no rank
+        # handed out earlier in the batch is renumbered under it
+        crowded = {
+            target_column_id for _, _, target_column_id, prev_rank, next_rank in drops
+            if prev_rank is not None and next_rank is not None and rank_between(prev_rank, next_rank) is None
+        }
+        placements = {column_id: rebalance_placements(column_id, revision) for column_id in crowded}
+
+        operations = []
+        applied = []
+        last_placed = {}
+        for index, task_id, target_column_id, prev_rank, next_rank in drops:
+            move = moves[index]
+            # Cards dropped into the same slot keep the order they were sent in
+            slot = (target_column_id, prev_rank, next_rank)
+
+            if target_column_id in placements:
+                placed = placements[target_column_id]
+                if prev_rank is not None:
+                    prev_rank = placement_rank(placed, move.get('prevTaskId'), prev_rank, last=True)
+                if next_rank is not None:
+                    next_rank = placement_rank(placed, move.get('nextTaskId'), next_rank, last=False)
+                if (move.get('prevOrder') is not None and prev_rank is None) or \
+                        (move.get('nextOrder') is not None and next_rank is None):
+                    results[index]['message'] = 'The column has changed, reload the board'
+                    continue
+
+            order = rank_between(last_placed.get(slot, prev_rank), next_rank)
+            if order is None:
+                results[index]['message'] = 'The column has changed, reload the board'
+                continue
+            last_placed[slot] = order
+
+            operations.append(UpdateOne(
+                {'_id': task_id, 'column_id': current_columns[task_id]},
+                {'$set': {'column_id': target_column_id, 'order': order, 'updated_at': now, 'revision': revision}}
+            ))
+            applied.append((index, task_id, current_columns[task_id], target_column_id, order))
+
+        confirmed = []
+        bulk_result = tasks_collection.bulk_write(operations, ordered=False) if operations else None
+        if bulk_result:
+            if bulk_result.matched_count == len(operations):
+                confirmed = applied
+            else:
+                # Some tasks moved concurrently; check which writes landed
+                landed = {
+                    (task['_id'], task['column_id'], task.get('order')) for task in
+                    tasks_collection.find({'_id': {'$in': [item[1] for item in applied]}}, {'column_id': 1, 'order': 1})
+                }
+                confirmed = [item for item in applied if (item[1], item[3], item[4]) in landed]
+
+        confirmed_indexes = set()
+        for index, task_id, source_column_id, target_column_id, order in confirmed:
+            confirmed_indexes.add(index)
+            results[index].update({
+                'success': True,
+                'sourceColumnId': str(source_column_id),
+                'targetColumnId': str(target_column_id),
+                'order': order
+            })
+        for index, *_ in applied:
+            if index not in confirmed_indexes:
+                results[index]['message'] = 'Task was changed by someone else'
+
+        watermark = release_revision(
+            project_id, revision, tasks_moved(project, [(item[2], item[3]) for item in confirmed])
+        )
+
+        if confirmed:
+            socketio = get_socketio()
+            if socketio:
+                broadcast_to_project(
+                    project_id,
+                    'tasks_moved',
+                    {
+                        'type': 'task_move_batch',
+                        'moves': [results[item[0]] for item in confirmed],
+                        'userId': user_id,
+                        'userName': session.get('name', 'Anonymous User'),
+                        'timestamp': datetime.now().isoformat()
+                    }
+                )
+
+        return jsonify({
+            'success': len(confirmed) == len(moves),
+            'moved': len(confirmed),
+            'revision': watermark,
+            'results': results
         })
+
+    except Exception as e:
+        print(f"Task batch move error: {e}")
+        return jsonify({'success': False, 'message': 'Internal server error'}), 500
+
+def task_update(project_id, task_id):
+    try:
+        user_id = session.get('user_id')
+
+        project = current_project()
         
         if not project:
-            flash('Project not found or you do not have access to it.', 'error')
-            return redirect(url_for('projects'))
+            return board_response(project_id, 'Project not found or you do not have access to it.', 'error', 404, redirect_to=url_for('projects'))
 
         task = tasks_collection.find_one({
             '_id': ObjectId(task_id),
@@ -274,8 +551,7 @@ def task_update(project_id, task_id):
         })
         
         if not task:
-            flash('Task not found.', 'error')
-            return redirect(url_for('view_project', project_id=project_id))
+            return board_response(project_id, 'Task not found.', 'error', 404)
         
         if request.method == 'POST':
             title = request.form['title'].strip()
@@ -288,8 +564,7 @@ def task_update(project_id, task_id):
             assigned_to = request.form.get('assigned_to', user_id).strip()
 
             if not title:
-                flash('Task title is required!', 'error')
-                return redirect(url_for('update_task', project_id=project_id, task_id=task_id))
+                return board_response(project_id, 'Task title is required!', 'error', 400, redirect_to=url_for('edit_task', project_id=project_id, task_id=task_id))
             
             column = column_collection.find_one({
                 '_id': ObjectId(column_id),
@@ -297,16 +572,14 @@ def task_update(project_id, task_id):
             })
             
             if not column:
-                flash('Invalid column selected.', 'error')
-                return redirect(url_for('update_task', project_id=project_id, task_id=task_id))
+                return board_response(project_id, 'Invalid column selected.', 'error', 400, redirect_to=url_for('edit_task', project_id=project_id, task_id=task_id))
 
             due_date = None
             if due_date_str:
                 try:
                     due_date = datetime.strptime(due_date_str, '%Y-%m-%d')
                 except ValueError:
-                    flash('Invalid due date format.', 'error')
-                    return redirect(url_for('update_task', project_id=project_id, task_id=task_id))
+                    return board_response(project_id, 'Invalid due date format.', 'error', 400, redirect_to=url_for('edit_task', project_id=project_id, task_id=task_id))
 
             labels = []
             if labels_str:
@@ -330,24 +603,29 @@ def task_update(project_id, task_id):
                 'column_id': ObjectId(column_id),
                 'assigned_to': assigned_to,
                 'assignee_name': assignee_name,
-                'assignee_initials': assignee_initials,
-                'updated_at': datetime.now()
+                'assignee_initials': assignee_initials
             }
 
+            # An unchanged form would only use up a revision
+            if all(task.get(field) == value for field, value in update_data.items()):
+                return board_response(project_id, 'No changes were made to the task.', 'info')
+
+            update_data['updated_at'] = datetime.now()
+            update_data['revision'] = next_revision(project_id)
             if str(task['column_id']) != column_id:
-                last_task = tasks_collection.find_one(
-                    {'column_id': ObjectId(column_id)},
-                    sort=[('order', -1)]
-                )
-                next_order = (last_task.get('order', -1) + 1) if last_task else 0
-                update_data['order'] = next_order
+                update_data['order'] = append_rank()
             
             result = tasks_collection.update_one(
-                {'_id': ObjectId(task_id)},
+                {'_id': ObjectId(task_id), 'column_id': task['column_id']},
                 {'$set': update_data}
             )
+            watermark = release_revision(
+                project_id, update_data['revision'],
+                task_moved(project, task['column_id'], column['_id']) if result.modified_count else None
+            )
             
             if result.modified_count > 0:
+
                 socketio = get_socketio()
                 if socketio:
                     broadcast_to_project(
@@ -373,10 +651,13 @@ def task_update(project_id, task_id):
                         }
                     )
                 
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(
+                    project_id,
+                    revision=watermark,
+                    task={'_id': task_id, **update_data}
+                )
             else:
-                flash('No changes were made to the task.', 'info')
-                return redirect(url_for('view_project', project_id=project_id))
+                return board_response(project_id, 'No changes were made to the task.', 'info')
 
         columns = list(column_collection.find({'project': ObjectId(project_id)}).sort('order', 1))
         project_members = list(users_collection.find({'_id': {'$in': project.get('members', [])}}))
@@ -389,23 +670,15 @@ def task_update(project_id, task_id):
         
     except Exception as e:
         print(f"Task update error: {e}")
-        flash('An error occurred while updating the task.', 'error')
-        return redirect(url_for('view_project', project_id=project_id))
+        return board_response(project_id, 'An error occurred while updating the task.', 'error', 500)
 
 def task_delete(project_id, task_id):
     try:
         user_id = session.get('user_id')
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
-        })
+        project = current_project()
         
         if not project:
-            flash('Project not found or you do not have access to it.', 'error')
-            return redirect(url_for('projects'))
+            return board_response(project_id, 'Project not found or you do not have access to it.', 'error', 404, redirect_to=url_for('projects'))
 
         task = tasks_collection.find_one({
             '_id': ObjectId(task_id),
@@ -413,8 +686,7 @@ def task_delete(project_id, task_id):
         })
         
         if not task:
-            flash('Task not found.', 'error')
-            return redirect(url_for('view_project', project_id=project_id))
+            return board_response(project_id, 'Task not found.', 'error', 404)
     
         task_title = task.get('title', 'Unknown Task')
         column_id = str(task.get('column_id'))
@@ -422,6 +694,10 @@ def task_delete(project_id, task_id):
         result = tasks_collection.delete_one({'_id': ObjectId(task_id)})
         
         if result.deleted_count > 0:
+            revision = next_revision(project_id)
+            record_deletion(project_id, 'task', task_id, revision)
+            watermark = release_revision(project_id, revision, task_removed(project, task['column_id']))
+
             socketio = get_socketio()
             if socketio:
                 broadcast_to_project(
@@ -437,45 +713,75 @@ def task_delete(project_id, task_id):
                         'timestamp': datetime.now().isoformat()
                     }
                 )
-            
+
+            return board_response(project_id, revision=watermark, task_id=task_id)
         else:
-            flash('Failed to delete task.', 'error')
-        
-        return redirect(url_for('view_project', project_id=project_id))
+            return board_response(project_id, 'Failed to delete task.', 'error', 500)
         
     except Exception as e:
         print(f"Task delete error: {e}")
-        flash('An error occurred while deleting the task.', 'error')
-        return redirect(url_for('view_project', project_id=project_id))
+        return board_response(project_id, 'An error occurred while deleting the task.', 'error', 500)
     
+TASK_DETAIL_FIELDS = {
+    'title': 1, 'description': 1, 'type': 1, 'priority': 1, 'due_date': 1, 'created_at': 1,
+    'labels': 1, 'assignee_name': 1, 'assignee_initials': 1, 'column_id': 1
+}
+
+
+async def _load_task_detail(project_id, task_filter, load_project):
+    """Task, the project's columns and, if needed, the project in one round trip's time.
+
+    The task's column is not known until the task is read, but a board has
+    few columns, so fetching all of them alongside is cheaper than waiting.
+    """
+    db = async_db()
+    queries = [
+        db.tasks.find_one(task_filter, TASK_DETAIL_FIELDS),
+        find_list(db.columns, {'project': ObjectId(project_id)}, {'label': 1, 'color': 1})
+    ]
+    if load_project:
+        queries.append(db.projects.find_one({'_id': ObjectId(project_id), **NOT_DELETED}, PROJECT_EXCLUDED_FIELDS))
+    return await asyncio.gather(*queries)
+
 def task_view_detail(project_id, task_id):
     try:
-        user_id = session.get('user_id')
-        project = projects_collection.find_one({
-            '_id': ObjectId(project_id),
-            '$or': [
-                {'user_id': user_id},
-                {'members': ObjectId(user_id)}
-            ]
-        })
-        
+        task_filter = {'_id': ObjectId(task_id), 'project_id': ObjectId(project_id)}
+
+        # Every task write bumps revision/updated_at, so they are enough to
+        # answer a revalidation from the _id index alone
+        version = tasks_collection.find_one(task_filter, {'revision': 1, 'updated_at': 1})
+        if not version:
+            return jsonify({'success': False, 'message': 'Task not found'}), 404
+
+        etag = document_etag(task_id, version.get('revision', 0), version.get('updated_at', 0))
+        if is_not_modified(etag, version.get('updated_at')):
+            return not_modified_response(etag, version.get('updated_at'))
+
+        if async_mongo_enabled():
+            # A role cache miss has already loaded the project
+            load_project = 'project' not in g
+            task, columns, *project = run_async(_load_task_detail(project_id, task_filter, load_project))
+            if load_project:
+                g.project = project[0]
+            column = next((c for c in columns if task and c['_id'] == task['column_id']), None)
+
+        project = current_project()
+
         if not project:
             return jsonify({'success': False, 'message': 'Access denied'}), 403
 
-        task = tasks_collection.find_one({
-            '_id': ObjectId(task_id),
-            'project_id': ObjectId(project_id)
-        })
-        
+        if not async_mongo_enabled():
+            task = tasks_collection.find_one(task_filter, TASK_DETAIL_FIELDS)
+            column = column_collection.find_one(
+                {'_id': task['column_id']},
+                {'label': 1, 'color': 1}
+            ) if task else None
+
         if not task:
             return jsonify({'success': False, 'message': 'Task not found'}), 404
 
-        column = column_collection.find_one({
-            '_id': task['column_id']
-        })
-
         task_data = {
-            '_id': str(task['_id']),
+            '_id': task['_id'],
             'title': task.get('title', ''),
             'description': task.get('description', ''),
             'type': task.get('type', 'task'),
@@ -488,13 +794,14 @@ def task_view_detail(project_id, task_id):
             'column_name': column.get('label', '') if column else '',
             'column_color': column.get('color', 'light-blue') if column else 'light-blue',
             'project_name': project.get('project_name', ''),
-            'project_id': str(project['_id'])
+            'project_id': project['_id']
         }
 
-        return jsonify({
+        response = jsonify({
             'success': True,
             'task': task_data
         })
+        return with_validators(response, etag, version.get('updated_at'))
         
     except Exception as e:
         print(f"Task detail view error: {e}")
@@ -0,0 +1,183 @@
+"""Index registry for the kanban_app database.
+
+Every query pattern issued from routes/ has a matching index declared here.
+Indexes are applied at deploy time, not on import:
+
+    python schema.py apply     # create any missing indexes (idempotent)
+    python schema.py check     # report drift against the live database
+"""
+import sys
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+# Case-insensitive comparison, matches the '^label$' / 'i' check in column_create
+CASE_INSENSITIVE = {'locale': 'en', 'strength': 2}
+
+INDEXES = {
+    'users': [
+        # auth_login, auth_register, confirm_email, authorize_google, project_add_member
+        {'keys': [('email', ASCENDING)], 'unique': True},
+    ],
+    'projects': [
+        # '$or': [{'user_id': ...}, {'members': ...}] access checks, sorted by created_at
+        {'keys': [('user_id', ASCENDING), ('created_at', DESCENDING)]},
+        {'keys': [('members', ASCENDING), ('created_at', DESCENDING)]},
+        # duplicate-name check in project_create
+        {'keys': [('user_id', ASCENDING), ('project_name', ASCENDING)]},
+        # projects waiting for utils.project_purge, hidden from my_tasks
+        {'keys': [('deleted_at', ASCENDING)], 'partialFilterExpression': {'deleted_at': {'$type': 'date'}}},
+    ],
+    'columns': [
+        # board pipeline in project_view, next order lookup in column_create
+        {'keys': [('project', ASCENDING), ('order', ASCENDING)]},
+        {'keys': [('project', ASCENDING), ('label', ASCENDING)],
+         'unique': True, 'collation': CASE_INSENSITIVE},
+        # /projects/<id>/changes
+        {'keys': [('project', ASCENDING), ('revision', ASCENDING)]},
+    ],
+    'tasks': [
+        # my_tasks
+        {'keys': [('assigned_to', ASCENDING), ('due_date', ASCENDING)]},
+        # last task lookup in task_create / task_move / task_update, board per-column tasks
+        {'keys': [('column_id', ASCENDING), ('order', ASCENDING)]},
+        # project scoped task lookups, counts and cascade deletes
+        {'keys': [('project_id', ASCENDING), ('column_id', ASCENDING)]},
+        # /projects/<id>/changes
+        {'keys': [('project_id', ASCENDING), ('revision', ASCENDING)]},
+    ],
+    'comments': [
+        # comment_list
+        {'keys': [('task_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)]},
+        # cascade deletes
+        {'keys': [('project_id', ASCENDING)]},
+    ],
+    'tombstones': [
+        # deletions reported by /projects/<id>/changes
+        {'keys': [('project_id', ASCENDING), ('revision', ASCENDING)]},
+        # compact_tombstones in utils.revisions
+        {'keys': [('deleted_at', ASCENDING)]},
+    ],
+    'outbox': [
+        # due-message claims in utils.outbox
+        {'keys': [('status', ASCENDING), ('next_attempt_at', ASCENDING)]},
+        # sent and failed messages are kept a week; pending ones have no finished_at
+        {'keys': [('finished_at', ASCENDING)], 'expireAfterSeconds': 7 * 24 * 3600},
+    ],
+    'jobs': [
+        # purge job claims in utils.project_purge
+        {'keys': [('type', ASCENDING), ('status', ASCENDING), ('created_at', ASCENDING)]},
+    ],
+    'recent_views': [
+        # write-behind upserts from utils.recent_views
+        {'keys': [('user_id', ASCENDING), ('project_id', ASCENDING)], 'unique': True},
+        # "Recently Viewed" section of the dashboard
+        {'keys': [('user_id', ASCENDING), ('viewed_at', DESCENDING)]},
+        # project purge
+        {'keys': [('project_id', ASCENDING)]},
+    ],
+}
+
+# Options compared when checking for drift
+_COMPARED_OPTIONS = ('unique', 'sparse', 'partialFilterExpression', 'expireAfterSeconds', 'collation')
+
+
+def index_name(spec):
+    # Same naming scheme as pymongo, so indexes created before this registry
+    # existed (e.g. columns project_1_order_1) are recognised instead of conflicting
+    return '_'.join(f"{field}_{direction}" for field, direction in spec['keys'])
+
+
+def _index_options(spec):
+    options = {'name': index_name(spec)}
+    for option in _COMPARED_OPTIONS:
+        if option in spec:
+            options[option] = spec[option]
+    return options
+
+
+def _normalize_collation(collation):
+    # The server echoes back every collation field with defaults filled in
+    if not collation:
+        return None
+    return {key: collation[key] for key in CASE_INSENSITIVE if key in collation}
+
+
+def ensure_indexes(db, verbose=False):
+    """Create every declared index. Safe to run repeatedly."""
+    created = []
+    for collection_name, specs in INDEXES.items():
+        collection = db[collection_name]
+        for spec in specs:
+            name = collection.create_index(spec['keys'], **_index_options(spec))
+            created.append(f"{collection_name}.{name}")
+            if verbose:
+                print(f"ensured {collection_name}.{name}")
+    return created
+
+
+def check_indexes(db):
+    """Compare declared indexes with the live database.
+
+    Returns a list of (collection, index name, problem) tuples. An empty
+    list means there is no drift.
+    """
+    drift = []
+    for collection_name, specs in INDEXES.items():
+        try:
+            live = db[collection_name].index_information()
+        except OperationFailure:
+            live = {}
+
+        declared_names = set()
+        for spec in specs:
+            name = index_name(spec)
+            declared_names.add(name)
+            info = live.get(name)
+
+            if info is None:
+                drift.append((collection_name, name, 'missing'))
+                continue
+
+            if [tuple(key) for key in info['key']] != [tuple(key) for key in spec['keys']]:
+                drift.append((collection_name, name, f"keys differ: live={info['key']}"))
+
+            for option in _COMPARED_OPTIONS:
+                declared = spec.get(option)
+                current = info.get(option)
+                if option == 'collation':
+                    declared = _normalize_collation(declared)
+                    current = _normalize_collation(current)
+                if bool(declared) != bool(current) or (declared and declared != current):
+                    drift.append((collection_name, name, f"{option} differs: live={current!r} declared={declared!r}"))
+
+        for name in live:
+            if name != '_id_' and name not in declared_names:
+                drift.append((collection_name, name, 'undeclared'))
+
+    return drift
+
+
+def main(argv):
+    from db import db
+
+    command = argv[1] if len(argv) > 1 else 'check'
+
+    if command == 'apply':
+        ensure_indexes(db, verbose=True)
+        return 0
+
+    if command == 'check':
+        drift = check_indexes(db)
+        for collection_name, name, problem in drift:
+            print(f"{collection_name}.{name}: {problem}")
+        if not drift:
+            print("No index drift.")
+        return 1 if drift else 0
+
+    print("Usage: python schema.py [apply|check]")
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
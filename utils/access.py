@@ -0,0 +1,123 @@
+"""Project membership lookups shared by every project scoped route.
+
+project_role() answers "what is this user on this project" from, in order:
+the per-request memo on flask.g, a bounded process-wide TTL/LRU cache, and
+finally a projected find_one. Only positive answers are cached so a newly
+added member never waits out the TTL; project_add_member,
+project_remove_member and project_delete call invalidate_project() so
+removals take effect immediately in this process and within
+ACCESS_CACHE_TTL seconds everywhere else.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from bson import ObjectId
+from flask import g, has_app_context
+
+from db import projects_collection
+from utils.project_purge import NOT_DELETED
+
+ACCESS_CACHE_TTL = 30
+ACCESS_CACHE_SIZE = 10000
+
+# Fields handlers never read off the request's project document
+PROJECT_EXCLUDED_FIELDS = {'column_counts': 0, 'in_flight': 0}
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _cache_get(key):
+    with _lock:
+        entry = _cache.get(key)
+        if entry is None:
+            return None
+        role, expires_at = entry
+        if expires_at < time.monotonic():
+            del _cache[key]
+            return None
+        _cache.move_to_end(key)
+        return role
+
+
+def _cache_set(key, role):
+    with _lock:
+        _cache[key] = (role, time.monotonic() + ACCESS_CACHE_TTL)
+        _cache.move_to_end(key)
+        while len(_cache) > ACCESS_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def invalidate_project(project_id, user_id=None):
+    """Drop cached roles for one member of a project, or for all of them."""
+    project_id = str(project_id)
+    with _lock:
+        if user_id is not None:
+            _cache.pop((str(user_id), project_id), None)
+        else:
+            for key in [key for key in _cache if key[1] == project_id]:
+                del _cache[key]
+
+    roles = g.get('_project_roles') if has_app_context() else None
+    if roles:
+        for key in [key for key in roles if key[1] == project_id and (user_id is None or key[0] == str(user_id))]:
+            del roles[key]
+
+
+def _role_for(project, user_id):
+    if project.get('user_id') == user_id:
+        return 'owner'
+    return 'member'
+
+
+def project_role(user_id, project_id):
+    """Return 'owner', 'member' or None.
+
+    invalidate_project() only clears this process's cache; other workers keep
+    a removed member's role for up to ACCESS_CACHE_TTL seconds.
+    """
+    if not user_id or not ObjectId.is_valid(project_id) or not ObjectId.is_valid(user_id):
+        return None
+
+    key = (str(user_id), str(project_id))
+
+    roles = g.setdefault('_project_roles', {})
+    if key in roles:
+        return roles[key]
+
+    role = _cache_get(key)
+    if role is None:
+        project = projects_collection.find_one(
+            {
+                '_id': ObjectId(project_id),
+                **NOT_DELETED,
+                '$or': [
+                    {'user_id': user_id},
+                    {'members': ObjectId(user_id)}
+                ]
+            },
+            PROJECT_EXCLUDED_FIELDS
+        )
+        if project:
+            role = _role_for(project, user_id)
+            _cache_set(key, role)
+            # The request's own project: current_project() needs no second query
+            if str(g.get('project_id')) == str(project_id):
+                g.project = project
+
+    roles[key] = role
+    return role
+
+
+def current_project():
+    """The project named in the URL, loaded at most once per request.
+
+    Only valid inside a route protected by project_access_required.
+    """
+    if 'project' not in g:
+        g.project = projects_collection.find_one(
+            {'_id': ObjectId(g.project_id), **NOT_DELETED},
+            PROJECT_EXCLUDED_FIELDS
+        )
+    return g.project
@@ -0,0 +1,41 @@
+"""Optional async execution mode (ASYNC_MONGO).
+
+With app.config['ASYNC_MONGO'] on, the hot read paths (the board in
+project_view, task_view_detail) run their queries as coroutines on an
+AsyncMongoClient and issue the independent ones concurrently, so a request
+waits for the slowest query instead of the sum of them.
+
+All coroutines run on one event loop owned by a daemon thread; a handler
+hands its coroutine over with run_async() and waits for the result. The
+rest of the app, including Socket.IO, keeps running as before.
+
+    ASYNC_MONGO=1 python app.py
+"""
+import asyncio
+import threading
+
+from flask import current_app
+
+ASYNC_TIMEOUT = 30
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def async_mongo_enabled():
+    return bool(current_app.config.get('ASYNC_MONGO'))
+
+
+def _get_loop():
+    global _loop
+
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name='async-mongo', daemon=True).start()
+    return _loop
+
+
+def run_async(coro, timeout=ASYNC_TIMEOUT):
+    """Run a coroutine on the shared loop and return its result."""
+    return asyncio.run_coroutine_threadsafe(coro, _get_loop()).result(timeout)
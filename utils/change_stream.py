@@ -0,0 +1,159 @@
+"""Broadcast board deltas from MongoDB change streams.
+
+Route handlers only broadcast what they remember to; comment writes and
+scripts never did. With CHANGE_STREAM_BROADCASTS enabled, each process
+tails the change stream of the tasks, columns, comments, projects and
+tombstones collections, maps every change to its project room and emits a
+compact 'board_delta' to its own clients (route handler broadcasts are
+switched off, see utils.socket):
+
+    {'collection': 'tasks', 'op': 'update', 'id': '...', 'fields': {...}, 'removed': [...]}
+
+Task deletes are reported through their tombstone. Other deletes carry no
+document, so the project comes from the pre-image, which the watcher turns
+on for PRE_IMAGE_COLLECTIONS (MongoDB 6.0+).
+
+Each watcher keeps its resume token in memory: it only serves its own
+process's clients, and those reload the board when the process restarts.
+
+Change streams need a replica set; a local single-node one is enough:
+
+    mongod --replSet rs0 --dbpath /tmp/rs0
+    mongosh --eval 'rs.initiate()'
+    python -m utils.change_stream    # print deltas as they happen
+"""
+import threading
+import time
+
+from pymongo.errors import PyMongoError
+
+from db import db
+from utils.responses import to_json_safe
+
+WATCHED_COLLECTIONS = ('tasks', 'columns', 'comments', 'projects', 'tombstones')
+PRE_IMAGE_COLLECTIONS = ('columns', 'comments')
+
+# Bookkeeping that changes on every write and means nothing to the board
+IGNORED_FIELDS = {
+    'updated_at', 'revision', 'in_flight', 'tombstone_floor',
+    # project counters from utils.counters
+    'task_count', 'done_count', 'progress', 'column_counts'
+}
+IGNORED_PREFIXES = ('column_counts.', 'in_flight.')
+
+_watcher = None
+_watcher_lock = threading.Lock()
+
+
+def _project_id_for(collection, change):
+    document = change.get('fullDocument') or change.get('fullDocumentBeforeChange') or {}
+    if collection == 'projects':
+        return change['documentKey']['_id']
+    if collection == 'columns':
+        return document.get('project')
+    return document.get('project_id')
+
+
+def to_delta(change):
+    """Map a change event to (project_id, delta), or (None, None) to skip it."""
+    collection = change['ns']['coll']
+    op = change['operationType']
+
+    if collection == 'tombstones':
+        if op != 'insert':
+            return None, None
+        tombstone = change['fullDocument']
+        return tombstone['project_id'], {
+            'collection': f"{tombstone['kind']}s",
+            'op': 'delete',
+            'id': str(tombstone['item_id'])
+        }
+
+    # The tombstone already reported it
+    if collection == 'tasks' and op == 'delete':
+        return None, None
+
+    project_id = _project_id_for(collection, change)
+    if project_id is None:
+        return None, None
+
+    delta = {
+        'collection': collection,
+        'op': op,
+        'id': str(change['documentKey']['_id'])
+    }
+
+    if op == 'update':
+        description = change.get('updateDescription') or {}
+        fields = {
+            name: value for name, value in (description.get('updatedFields') or {}).items()
+            if name not in IGNORED_FIELDS and not name.startswith(IGNORED_PREFIXES)
+        }
+        removed = [
+            name for name in description.get('removedFields') or []
+            if name not in IGNORED_FIELDS and not name.startswith(IGNORED_PREFIXES)
+        ]
+        if not fields and not removed:
+            return None, None
+        delta['fields'] = to_json_safe(fields)
+        delta['removed'] = removed
+    elif op in ('insert', 'replace'):
+        delta['fields'] = to_json_safe(change.get('fullDocument') or {})
+
+    return project_id, delta
+
+
+def enable_pre_images():
+    """Have deletes in PRE_IMAGE_COLLECTIONS carry the deleted document."""
+    for name in PRE_IMAGE_COLLECTIONS:
+        try:
+            db.command('collMod', name, changeStreamPreAndPostImages={'enabled': True})
+        except PyMongoError as e:
+            print(f"Change stream pre-image error for {name}: {e}")
+
+
+def watch(on_delta):
+    """Tail the change stream forever, calling on_delta(project_id, delta)."""
+    pipeline = [
+        {'$match': {
+            'ns.coll': {'$in': list(WATCHED_COLLECTIONS)},
+            'operationType': {'$in': ['insert', 'update', 'replace', 'delete']}
+        }}
+    ]
+
+    token = None
+    while True:
+        try:
+            with db.watch(pipeline, full_document='updateLookup', full_document_before_change='whenAvailable',
+                          resume_after=token) as stream:
+                for change in stream:
+                    project_id, delta = to_delta(change)
+                    if delta:
+                        on_delta(project_id, delta)
+                    token = stream.resume_token
+        except PyMongoError as e:
+            print(f"Change stream error: {e}")
+            if token and 'resume' in str(e).lower():
+                # The token fell off the oplog; start again from now
+                token = None
+            time.sleep(1)
+
+
+def start_change_stream_watcher():
+    global _watcher
+
+    from utils.socket import broadcast_to_project
+
+    def on_delta(project_id, delta):
+        broadcast_to_project(project_id, 'board_delta', delta, local=True)
+
+    with _watcher_lock:
+        if _watcher is None:
+            enable_pre_images()
+            _watcher = threading.Thread(target=watch, args=(on_delta,), name='change-stream', daemon=True)
+            _watcher.start()
+    return _watcher
+
+
+if __name__ == '__main__':
+    watch(lambda project_id, delta: print(project_id, delta))
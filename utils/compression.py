@@ -0,0 +1,164 @@
+"""gzip/brotli response compression.
+
+Registered as an after_request hook by init_compression(app). A response is
+compressed when the client accepts gzip or br, its mimetype is in
+COMPRESS_MIMETYPES and it is at least COMPRESS_MIN_SIZE bytes. Streamed
+responses (stream_with_context, the comment list) are always compressed
+and are flushed chunk by chunk, so the client still receives them
+progressively.
+
+Brotli is used when the brotli package is installed and the client prefers
+it; otherwise gzip. Config:
+
+    COMPRESS_LEVEL       gzip level, 1-9 (default 6)
+    COMPRESS_BR_LEVEL    brotli quality, 0-11 (default 4)
+    COMPRESS_MIN_SIZE    bytes (default 500)
+    COMPRESS_MIMETYPES   set of mimetypes to compress
+
+compression_stats() returns per-endpoint counters of the bytes before and
+after compression.
+"""
+import threading
+import zlib
+from collections import defaultdict
+
+from flask import request, current_app
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+DEFAULT_MIMETYPES = {
+    'text/html', 'text/css', 'text/plain', 'text/javascript',
+    'application/javascript', 'application/json', 'image/svg+xml'
+}
+
+_stats_lock = threading.Lock()
+_stats = defaultdict(lambda: {'responses': 0, 'compressed': 0, 'bytes_in': 0, 'bytes_out': 0})
+
+
+def _record(endpoint, bytes_in, bytes_out):
+    with _stats_lock:
+        stats = _stats[endpoint or 'unknown']
+        stats['compressed'] += 1
+        stats['bytes_in'] += bytes_in
+        stats['bytes_out'] += bytes_out
+
+
+def compression_stats():
+    """{endpoint: {'responses', 'compressed', 'bytes_in', 'bytes_out', 'saved'}}"""
+    with _stats_lock:
+        return {
+            endpoint: {**stats, 'saved': stats['bytes_in'] - stats['bytes_out']}
+            for endpoint, stats in _stats.items()
+        }
+
+
+def _choose_encoding():
+    accepted = request.accept_encodings
+    gzip_quality = accepted['gzip']
+    br_quality = accepted['br'] if brotli is not None else 0
+    if br_quality and br_quality >= gzip_quality:
+        return 'br'
+    if gzip_quality:
+        return 'gzip'
+    return None
+
+
+class _Compressor:
+    def __init__(self, encoding, config):
+        if encoding == 'br':
+            self._compressor = brotli.Compressor(quality=config.get('COMPRESS_BR_LEVEL', 4))
+        else:
+            # wbits 31: gzip header and trailer
+            self._compressor = zlib.compressobj(config.get('COMPRESS_LEVEL', 6), zlib.DEFLATED, 31)
+        self.encoding = encoding
+
+    def chunk(self, data):
+        """Compress data and flush it, so it can be sent right away."""
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.flush()
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data=b''):
+        if self.encoding == 'br':
+            return self._compressor.process(data) + self._compressor.finish()
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+def _compress_stream(iterable, compressor, endpoint):
+    bytes_in = bytes_out = 0
+    try:
+        for data in iterable:
+            if isinstance(data, str):
+                data = data.encode()
+            if not data:
+                continue
+            bytes_in += len(data)
+            out = compressor.chunk(data)
+            bytes_out += len(out)
+            yield out
+        out = compressor.finish()
+        bytes_out += len(out)
+        yield out
+    finally:
+        if hasattr(iterable, 'close'):
+            iterable.close()
+        _record(endpoint, bytes_in, bytes_out)
+
+
+def _skip(response, config):
+    if response.status_code < 200 or response.status_code in (204, 304):
+        return True
+    if response.direct_passthrough or 'Content-Encoding' in response.headers:
+        return True
+    if 'no-transform' in response.headers.get('Cache-Control', ''):
+        return True
+    if response.mimetype not in config.get('COMPRESS_MIMETYPES', DEFAULT_MIMETYPES):
+        return True
+    return False
+
+
+def compress_response(response):
+    config = current_app.config
+    endpoint = request.endpoint
+
+    with _stats_lock:
+        _stats[endpoint or 'unknown']['responses'] += 1
+
+    response.vary.add('Accept-Encoding')
+    if _skip(response, config):
+        return response
+
+    encoding = _choose_encoding()
+    if not encoding:
+        return response
+
+    if not response.is_streamed:
+        data = response.get_data()
+        if len(data) < config.get('COMPRESS_MIN_SIZE', 500):
+            return response
+        compressed = _Compressor(encoding, config).finish(data)
+        response.set_data(compressed)
+        _record(endpoint, len(data), len(compressed))
+    else:
+        response.response = _compress_stream(response.response, _Compressor(encoding, config), endpoint)
+        response.headers.pop('Content-Length', None)
+
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed bytes differ from the identity ones
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
+
+
+def init_compression(app):
+    app.config.setdefault('COMPRESS_LEVEL', 6)
+    app.config.setdefault('COMPRESS_BR_LEVEL', 4)
+    app.config.setdefault('COMPRESS_MIN_SIZE', 500)
+    app.config.setdefault('COMPRESS_MIMETYPES', set(DEFAULT_MIMETYPES))
+    app.after_request(compress_response)
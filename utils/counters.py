@@ -0,0 +1,221 @@
+"""Denormalized task counters stored on the project document.
+
+    task_count              total tasks in the project
+    column_counts.<column>  tasks per column
+    done_count              tasks in the project's Done column
+    done_column_id          the column whose tasks count as completed
+
+Tasks carry their own comment_count, kept in step by comment_create and
+comment_delete so the board never has to look at the comments collection.
+
+Routes build the $inc for a successful write with task_added / task_removed /
+task_moved / tasks_moved and pass it to utils.revisions.release_revision,
+which applies it in the same update that releases the write's revision, so
+projects_list can read progress straight off the project document.
+
+Existing data is backfilled with:
+
+    python -m utils.counters backfill            # resumes where it stopped
+    python -m utils.counters backfill --restart
+    python -m utils.counters reconcile <project_id>
+    python -m utils.counters comments [<project_id>]
+"""
+import sys
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db import projects_collection, column_collection, tasks_collection, comments_collection, jobs_collection
+
+DONE_LABEL = 'Done'
+BACKFILL_JOB_ID = 'project_counters_backfill'
+
+
+def is_done_column(project, column_id):
+    done_column_id = project.get('done_column_id')
+    return done_column_id is not None and str(done_column_id) == str(column_id)
+
+
+def task_added(project, column_id):
+    """$inc for a task created in column_id."""
+    inc = {'task_count': 1, f'column_counts.{column_id}': 1}
+    if is_done_column(project, column_id):
+        inc['done_count'] = 1
+    return inc
+
+
+def task_removed(project, column_id):
+    """$inc for a task deleted from column_id."""
+    inc = {'task_count': -1, f'column_counts.{column_id}': -1}
+    if is_done_column(project, column_id):
+        inc['done_count'] = -1
+    return inc
+
+
+def task_moved(project, source_column_id, target_column_id):
+    return tasks_moved(project, [(source_column_id, target_column_id)])
+
+
+def tasks_moved(project, moves):
+    """A single $inc for many (source column, target column) moves."""
+    inc = {}
+    for source_column_id, target_column_id in moves:
+        if str(source_column_id) == str(target_column_id):
+            continue
+
+        source_field = f'column_counts.{source_column_id}'
+        target_field = f'column_counts.{target_column_id}'
+        inc[source_field] = inc.get(source_field, 0) - 1
+        inc[target_field] = inc.get(target_field, 0) + 1
+
+        done_delta = int(is_done_column(project, target_column_id)) - int(is_done_column(project, source_column_id))
+        if done_delta:
+            inc['done_count'] = inc.get('done_count', 0) + done_delta
+
+    return {field: delta for field, delta in inc.items() if delta}
+
+
+def column_added(project, column_id, label):
+    update = {f'column_counts.{column_id}': 0}
+    if label == DONE_LABEL and not project.get('done_column_id'):
+        update['done_column_id'] = column_id
+        project['done_column_id'] = column_id
+    projects_collection.update_one({'_id': project['_id']}, {'$set': update})
+
+
+def project_progress(project):
+    """Fill in total_tasks, completed_tasks, progress and status for templates."""
+    total_tasks = max(project.get('task_count', 0), 0)
+    completed_tasks = max(project.get('done_count', 0), 0)
+
+    project['total_tasks'] = total_tasks
+    project['completed_tasks'] = completed_tasks
+    project['progress'] = round(completed_tasks / total_tasks * 100) if total_tasks else 0
+
+    if total_tasks == 0:
+        project['status'] = 'not-started'
+    elif completed_tasks == total_tasks:
+        project['status'] = 'completed'
+    elif completed_tasks > 0:
+        project['status'] = 'in-progress'
+    else:
+        project['status'] = 'not-started'
+    return project
+
+
+def reconcile_project(project_id):
+    """Recompute the counters of one project from the tasks collection."""
+    project_id = ObjectId(project_id)
+
+    column_counts = {}
+    for column in column_collection.find({'project': project_id}, {'_id': 1}):
+        column_counts[str(column['_id'])] = 0
+
+    for row in tasks_collection.aggregate([
+        {'$match': {'project_id': project_id}},
+        {'$group': {'_id': '$column_id', 'count': {'$sum': 1}}}
+    ]):
+        column_counts[str(row['_id'])] = row['count']
+
+    done_column = column_collection.find_one(
+        {'project': project_id, 'label': DONE_LABEL},
+        {'_id': 1},
+        sort=[('order', 1)]
+    )
+    done_column_id = done_column['_id'] if done_column else None
+
+    projects_collection.update_one(
+        {'_id': project_id},
+        {'$set': {
+            'task_count': sum(column_counts.values()),
+            'column_counts': column_counts,
+            'done_count': column_counts.get(str(done_column_id), 0) if done_column_id else 0,
+            'done_column_id': done_column_id
+        }}
+    )
+
+
+def backfill(restart=False, batch_size=100):
+    """Reconcile every project in _id order, checkpointing after each batch.
+
+    An interrupted run picks up after the last checkpointed project.
+    """
+    if restart:
+        jobs_collection.delete_one({'_id': BACKFILL_JOB_ID})
+
+    job = jobs_collection.find_one({'_id': BACKFILL_JOB_ID}) or {}
+    last_id = job.get('last_id')
+    processed = job.get('processed', 0)
+
+    while True:
+        query = {'_id': {'$gt': last_id}} if last_id else {}
+        batch = list(projects_collection.find(query, {'_id': 1}).sort('_id', 1).limit(batch_size))
+        if not batch:
+            break
+
+        for project in batch:
+            reconcile_project(project['_id'])
+
+        last_id = batch[-1]['_id']
+        processed += len(batch)
+        jobs_collection.update_one(
+            {'_id': BACKFILL_JOB_ID},
+            {'$set': {'last_id': last_id, 'processed': processed}},
+            upsert=True
+        )
+        print(f"Reconciled {processed} projects (last {last_id})")
+
+    jobs_collection.update_one(
+        {'_id': BACKFILL_JOB_ID},
+        {'$set': {'completed': True}},
+        upsert=True
+    )
+    return processed
+
+
+def reconcile_comment_counts(project_id=None, batch_size=500):
+    """Repair comment_count drift on tasks, optionally for a single project.
+
+    Returns the number of tasks whose count was corrected.
+    """
+    match = {'project_id': ObjectId(project_id)} if project_id else {}
+
+    actual = {}
+    for row in comments_collection.aggregate([
+        {'$match': match},
+        {'$group': {'_id': '$task_id', 'count': {'$sum': 1}}}
+    ]):
+        actual[row['_id']] = row['count']
+
+    repaired = 0
+    operations = []
+    for task in tasks_collection.find(match, {'_id': 1, 'comment_count': 1}):
+        count = actual.get(task['_id'], 0)
+        if task.get('comment_count') != count:
+            operations.append(UpdateOne({'_id': task['_id']}, {'$set': {'comment_count': count}}))
+
+        if len(operations) >= batch_size:
+            tasks_collection.bulk_write(operations, ordered=False)
+            repaired += len(operations)
+            operations = []
+
+    if operations:
+        tasks_collection.bulk_write(operations, ordered=False)
+        repaired += len(operations)
+
+    return repaired
+
+
+if __name__ == '__main__':
+    command = sys.argv[1] if len(sys.argv) > 1 else ''
+
+    if command == 'backfill':
+        backfill(restart='--restart' in sys.argv)
+    elif command == 'reconcile' and len(sys.argv) > 2:
+        reconcile_project(sys.argv[2])
+    elif command == 'comments':
+        repaired = reconcile_comment_counts(sys.argv[2] if len(sys.argv) > 2 else None)
+        print(f"Repaired comment_count on {repaired} tasks")
+    else:
+        print("Usage: python -m utils.counters backfill [--restart] | reconcile <project_id> | comments [<project_id>]")
+        sys.exit(2)
@@ -1,6 +1,8 @@
-from flask import request, flash, redirect, url_for, session
+from flask import request, flash, redirect, url_for, session, jsonify, g
 from functools import wraps
 
+from utils.access import project_role
+
 def login_required(f):
     @wraps(f)
     def decorated_function(*args, **kwargs):
@@ -8,4 +10,33 @@ def login_required(f):
             flash('Please log in to access the page.', 'error')
             return redirect(url_for('login'))
         return f(*args, **kwargs)
-    return decorated_function
\ No newline at end of file
+    return decorated_function
+
+def project_access_required(role='member', api=False):
+    """Require the logged in user to be a member (or the owner) of <project_id>.
+
+    Sets g.project_id and g.project_role; handlers load the project itself
+    with utils.access.current_project(). JSON endpoints pass api=True to get
+    a 403 instead of a flash and redirect.
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            project_id = kwargs.get('project_id')
+            # Set first so a role cache miss can fill current_project() too
+            g.project_id = project_id
+            user_role = project_role(session.get('user_id'), project_id)
+
+            if user_role is None or (role == 'owner' and user_role != 'owner'):
+                if api:
+                    return jsonify({'success': False, 'message': 'Access denied'}), 403
+                if role == 'owner':
+                    flash('Project not found or you do not have permission to manage it.', 'error')
+                else:
+                    flash('Project not found or you do not have access to it.', 'error')
+                return redirect(url_for('projects'))
+
+            g.project_role = user_role
+            return f(*args, **kwargs)
+        return decorated_function
+    return decorator
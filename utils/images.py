@@ -0,0 +1,137 @@
+"""Profile picture processing.
+
+An upload is streamed to a temporary file in UPLOAD_CHUNK_SIZE chunks
+(rejected past MAX_AVATAR_BYTES) while its SHA-256 is computed. The image is
+decoded once, in a worker thread, and cut into square AVATAR_SIZES variants
+stored under the content hash:
+
+    <UPLOAD_FOLDER>/avatars/<sha256>/<size>.jpg
+
+The same bytes always map to the same files, so two users uploading
+"avatar.png" no longer overwrite each other, re-uploads are free, and the
+variants can be served with an immutable, year-long Cache-Control.
+"""
+import hashlib
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+AVATAR_SIZES = (64, 128, 256)
+DEFAULT_AVATAR_SIZE = 128
+MAX_AVATAR_BYTES = 5 * 1024 * 1024
+# A small file can still decode to a huge bitmap; checked before decoding
+MAX_AVATAR_PIXELS = 25_000_000
+UPLOAD_CHUNK_SIZE = 64 * 1024
+IMAGE_WORKERS = 2
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ImageTooLarge(ValueError):
+    pass
+
+
+class InvalidImage(ValueError):
+    pass
+
+
+def avatar_dir(upload_folder, digest):
+    return os.path.join(upload_folder, 'avatars', digest)
+
+
+def avatar_path(digest, size=DEFAULT_AVATAR_SIZE):
+    """Value stored in users.picture and the session."""
+    return f'avatars/{digest}/{size}.jpg'
+
+
+def _stream_to_disk(file_storage, directory):
+    os.makedirs(directory, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+
+    handle, tmp_path = tempfile.mkstemp(dir=directory, suffix='.upload')
+    try:
+        with os.fdopen(handle, 'wb') as out:
+            while True:
+                chunk = file_storage.stream.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > MAX_AVATAR_BYTES:
+                    raise ImageTooLarge(f'Image is larger than {MAX_AVATAR_BYTES // (1024 * 1024)} MB')
+                digest.update(chunk)
+                out.write(chunk)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+    return tmp_path, digest.hexdigest()
+
+
+def _make_variants(source_path, target_dir):
+    from PIL import Image, ImageOps
+
+    try:
+        with Image.open(source_path) as image:
+            if image.width * image.height > MAX_AVATAR_PIXELS:
+                raise ImageTooLarge(f'Image is larger than {MAX_AVATAR_PIXELS // 1_000_000} megapixels')
+            # JPEGs can be decoded at a reduced scale straight away
+            image.draft('RGB', (max(AVATAR_SIZES), max(AVATAR_SIZES)))
+            image = ImageOps.exif_transpose(image)
+            image = image.convert('RGB')
+    except ImageTooLarge:
+        raise
+    except Exception as e:
+        raise InvalidImage('File is not a readable image') from e
+
+    os.makedirs(target_dir, exist_ok=True)
+    for size in AVATAR_SIZES:
+        variant = ImageOps.fit(image, (size, size), Image.LANCZOS)
+        final_path = os.path.join(target_dir, f'{size}.jpg')
+        # A private temp file per write: threads can process the same upload at once
+        handle, tmp_path = tempfile.mkstemp(dir=target_dir, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as out:
+                variant.save(out, 'JPEG', quality=85, optimize=True, progressive=True)
+            os.replace(tmp_path, final_path)
+        except Exception:
+            os.remove(tmp_path)
+            raise
+
+
+def _get_executor():
+    global _executor
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=IMAGE_WORKERS, thread_name_prefix='avatar')
+    return _executor
+
+
+def _offload(fn, *args):
+    try:
+        from eventlet import patcher, tpool
+        if patcher.is_monkey_patched('thread'):
+            return tpool.execute(fn, *args)
+    except ImportError:
+        pass
+    return _get_executor().submit(fn, *args).result()
+
+
+def save_avatar(file_storage):
+    """Store an uploaded avatar and return its content hash."""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    tmp_path, digest = _stream_to_disk(file_storage, os.path.join(upload_folder, 'avatars'))
+
+    try:
+        target_dir = avatar_dir(upload_folder, digest)
+        if not all(os.path.exists(os.path.join(target_dir, f'{size}.jpg')) for size in AVATAR_SIZES):
+            _offload(_make_variants, tmp_path, target_dir)
+    finally:
+        os.remove(tmp_path)
+
+    return digest
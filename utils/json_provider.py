@@ -0,0 +1,114 @@
+"""JSON provider that understands Mongo documents.
+
+Installed as app.json, so jsonify() accepts ObjectId, datetime and the
+other BSON types as they come out of pymongo and handlers can return
+projected documents without copying every field into a new dict.
+
+orjson is used when it is installed (pip install orjson); otherwise the
+standard library encoder is used with the same conversions:
+
+    ObjectId, UUID, Decimal128  -> string
+    datetime, date              -> ISO 8601 string
+
+Compare the encoders and the old to_json_safe() path with:
+
+    python -m utils.json_provider [documents] [rounds]
+"""
+import json
+import sys
+import time
+import uuid
+from datetime import date, datetime
+
+from bson import ObjectId
+from bson.decimal128 import Decimal128
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def bson_default(value):
+    if isinstance(value, (ObjectId, uuid.UUID, Decimal128)):
+        return str(value)
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def dumps(value):
+    """Encode to a str with the same conversions as the app's provider."""
+    if orjson is not None:
+        return orjson.dumps(value, default=bson_default).decode()
+    return json.dumps(value, default=bson_default, separators=(',', ':'))
+
+
+class MongoJSONProvider(DefaultJSONProvider):
+    sort_keys = False
+    default = staticmethod(bson_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return orjson.dumps(obj, default=bson_default).decode()
+        kwargs.setdefault('default', bson_default)
+        return super().dumps(obj, **kwargs)
+
+    def response(self, *args, **kwargs):
+        if orjson is None:
+            return super().response(*args, **kwargs)
+
+        obj = self._prepare_response_obj(args, kwargs)
+        # Skips the bytes -> str -> bytes round trip of dumps()
+        return self._app.response_class(
+            orjson.dumps(obj, default=bson_default),
+            mimetype=self.mimetype
+        )
+
+
+def init_json(app):
+    app.json = MongoJSONProvider(app)
+    return app.json
+
+
+def _sample_documents(count):
+    now = datetime.now()
+    return [{
+        '_id': ObjectId(),
+        'task_id': ObjectId(),
+        'project_id': ObjectId(),
+        'user_id': str(ObjectId()),
+        'user_name': 'Sample User',
+        'comment': 'Looks good, merging after the review comments are addressed.',
+        'created_at': now,
+        'updated_at': now,
+        'edited': False,
+        'labels': ['backend', 'api']
+    } for _ in range(count)]
+
+
+def _bench(name, fn, documents, rounds):
+    fn(documents)
+    started = time.perf_counter()
+    for _ in range(rounds):
+        fn(documents)
+    elapsed = (time.perf_counter() - started) / rounds
+    print(f"{name:<28} {elapsed * 1000:8.3f} ms/round  {elapsed / len(documents) * 1e6:7.2f} us/doc")
+
+
+if __name__ == '__main__':
+    from utils.responses import to_json_safe
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    documents = _sample_documents(count)
+
+    print(f"{count} documents, {rounds} rounds")
+    _bench('to_json_safe + json.dumps', lambda docs: json.dumps(to_json_safe(docs)), documents, rounds)
+    _bench('json.dumps(default=...)',
+           lambda docs: json.dumps(docs, default=bson_default, separators=(',', ':')), documents, rounds)
+    if orjson is not None:
+        _bench('orjson (bytes)', lambda docs: orjson.dumps(docs, default=bson_default), documents, rounds)
+    else:
+        print("orjson is not installed; pip install orjson to compare it")
@@ -0,0 +1,266 @@
+"""Prometheus metrics, served as text at /metrics.
+
+Recording is a single deque.append() of the observation, which is atomic in
+CPython, so request threads never take a lock. The observations are folded
+into the totals when /metrics is scraped (or by whichever thread notices
+more than FOLD_THRESHOLD of them waiting), under a lock only the folding
+thread holds.
+
+Recorded directly:
+    http_requests_total{endpoint,method,status}
+    http_request_duration_seconds{endpoint}          histogram
+    mongo_pool_*{address}                            pool events from db.py's client
+    outbox_send_seconds, outbox_messages_total{status}
+
+Read from the existing stats at scrape time: Socket.IO rooms
+(room_stats), bcrypt pool (password_pool_stats), compression
+(compression_stats), per-request queries (query_stats) and the outbox queue.
+"""
+import threading
+import time
+from collections import defaultdict, deque
+
+from flask import g, request
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+FOLD_THRESHOLD = 10000
+
+_events = deque()
+_fold_lock = threading.Lock()
+_counters = defaultdict(float)
+_histograms = {}
+
+HELP = {
+    'http_requests_total': ('counter', 'HTTP requests handled'),
+    'http_request_duration_seconds': ('histogram', 'HTTP request latency'),
+    'mongo_pool_connections_created_total': ('counter', 'Connections opened by the pymongo pool'),
+    'mongo_pool_connections_closed_total': ('counter', 'Connections closed by the pymongo pool'),
+    'mongo_pool_checkouts_total': ('counter', 'Connections checked out of the pool'),
+    'mongo_pool_checkins_total': ('counter', 'Connections checked back into the pool'),
+    'mongo_pool_checkout_failures_total': ('counter', 'Failed checkouts, by reason'),
+    'mongo_pool_cleared_total': ('counter', 'Times the pool was cleared'),
+    'mongo_pool_checkout_seconds': ('histogram', 'Time spent waiting for a pooled connection'),
+    'outbox_send_seconds': ('histogram', 'SMTP send time per message'),
+    'outbox_messages_total': ('counter', 'Outbox send attempts, by outcome'),
+}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    _events.append((name, _labels(labels), amount, False))
+    _maybe_fold()
+
+
+def observe(name, value, **labels):
+    _events.append((name, _labels(labels), value, True))
+    _maybe_fold()
+
+
+def _maybe_fold():
+    if len(_events) > FOLD_THRESHOLD and _fold_lock.acquire(blocking=False):
+        try:
+            _fold()
+        finally:
+            _fold_lock.release()
+
+
+def _fold():
+    while True:
+        try:
+            name, labels, value, is_histogram = _events.popleft()
+        except IndexError:
+            return
+        if not is_histogram:
+            _counters[(name, labels)] += value
+            continue
+        histogram = _histograms.get((name, labels))
+        if histogram is None:
+            histogram = _histograms[(name, labels)] = [0] * len(LATENCY_BUCKETS) + [0.0, 0]
+        for index, bound in enumerate(LATENCY_BUCKETS):
+            if value <= bound:
+                histogram[index] += 1
+        histogram[-2] += value
+        histogram[-1] += 1
+
+
+class PoolMetrics(monitoring.ConnectionPoolListener):
+    """Counts pymongo connection pool events; registered on the client in db.py."""
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        inc('mongo_pool_cleared_total', address=_address(event))
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        inc('mongo_pool_connections_created_total', address=_address(event))
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        inc('mongo_pool_connections_closed_total', address=_address(event))
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        inc('mongo_pool_checkout_failures_total', address=_address(event), reason=str(event.reason))
+
+    def connection_checked_out(self, event):
+        inc('mongo_pool_checkouts_total', address=_address(event))
+        # pymongo >= 4.7 reports how long the checkout took
+        duration = getattr(event, 'duration', None)
+        if duration is not None:
+            observe('mongo_pool_checkout_seconds', duration, address=_address(event))
+
+    def connection_checked_in(self, event):
+        inc('mongo_pool_checkins_total', address=_address(event))
+
+
+pool_metrics = PoolMetrics()
+
+
+def _address(event):
+    host, port = event.address
+    return f'{host}:{port}'
+
+
+def _before_request():
+    g._request_started = time.perf_counter()
+
+
+def _after_request(response):
+    started = g.pop('_request_started', None)
+    endpoint = request.endpoint or 'unknown'
+    inc('http_requests_total', endpoint=endpoint, method=request.method, status=str(response.status_code))
+    if started is not None:
+        observe('http_request_duration_seconds', time.perf_counter() - started, endpoint=endpoint)
+    return response
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + sorted(extra.items())
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _collected_gauges():
+    """(name, type, help, [(labels, value)]) read from the existing stats."""
+    from utils.socket import room_stats
+    from utils.passwords import password_pool_stats
+    from utils.compression import compression_stats
+    from utils.query_profiler import query_stats
+
+    families = []
+
+    # Summed over rooms: a label per project would grow without bound
+    rooms = room_stats().values()
+    families.append(('socket_rooms_active', 'gauge', 'Project rooms with at least one socket', [
+        ({}, sum(1 for stats in rooms if stats.get('connected')))
+    ]))
+    families.append(('socket_room_connected', 'gauge', 'Sockets joined to project rooms', [
+        ({}, sum(stats.get('connected', 0) for stats in rooms))
+    ]))
+    families.append(('socket_room_events_total', 'counter', 'Board events, by stage', [
+        ({'stage': stage}, sum(stats.get(stage, 0) for stats in rooms))
+        for stage in ('published', 'delivered', 'received_from_bus', 'coalesced', 'resyncs', 'skipped_slow')
+    ]))
+
+    passwords = password_pool_stats()
+    families.append(('password_hash_queued', 'gauge', 'bcrypt calls waiting for a slot', [({}, passwords['queued'])]))
+    families.append(('password_hash_active', 'gauge', 'bcrypt calls running', [({}, passwords['active'])]))
+    families.append(('password_hash_total', 'counter', 'bcrypt calls finished, by outcome', [
+        ({'outcome': 'completed'}, passwords['completed']),
+        ({'outcome': 'failed'}, passwords['failed'])
+    ]))
+    families.append(('password_hash_wait_seconds_total', 'counter', 'Time bcrypt calls waited for a slot', [
+        ({}, passwords['wait_seconds_total'])
+    ]))
+    families.append(('password_hash_seconds_total', 'counter', 'Time spent hashing', [
+        ({}, passwords['hash_seconds_total'])
+    ]))
+
+    compression = compression_stats()
+    families.append(('http_response_bytes_total', 'counter', 'Compressed response bytes before and after', [
+        ({'endpoint': endpoint, 'stage': stage}, stats[key])
+        for endpoint, stats in compression.items()
+        for stage, key in (('uncompressed', 'bytes_in'), ('compressed', 'bytes_out'))
+    ]))
+
+    queries = query_stats()
+    families.append(('mongo_request_queries_total', 'counter', 'Mongo commands issued by requests', [
+        ({'endpoint': endpoint}, stats['queries']) for endpoint, stats in queries.items()
+    ]))
+    families.append(('mongo_request_query_seconds_total', 'counter', 'Mongo time spent by requests', [
+        ({'endpoint': endpoint}, stats['duration_ms'] / 1000) for endpoint, stats in queries.items()
+    ]))
+
+    try:
+        from db import outbox_collection
+        # Sent and failed messages are history; counting them would scan the collection
+        families.append(('outbox_queue_messages', 'gauge', 'Outbox messages waiting, by status', [
+            ({'status': status}, outbox_collection.count_documents({'status': status}))
+            for status in ('pending', 'sending')
+        ]))
+    except Exception as e:
+        print(f"Metrics outbox error: {e}")
+
+    return families
+
+
+def render_metrics():
+    with _fold_lock:
+        _fold()
+        counters = dict(_counters)
+        histograms = {key: list(value) for key, value in _histograms.items()}
+
+    lines = []
+    by_name = defaultdict(list)
+    for (name, labels), value in counters.items():
+        by_name[name].append((labels, value))
+    for (name, labels), value in histograms.items():
+        by_name[name].append((labels, value))
+
+    for name in sorted(by_name):
+        kind, description = HELP.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in by_name[name]:
+            if kind != 'histogram':
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+                continue
+            # _fold() already counts each observation in every bucket it fits
+            for bound, count in zip(LATENCY_BUCKETS, value):
+                lines.append(f'{name}_bucket{_format_labels(labels, le=bound)} {count}')
+            lines.append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {value[-1]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {value[-2]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {value[-1]}')
+
+    for name, kind, description, samples in _collected_gauges():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for labels, value in samples:
+            lines.append(f'{name}{_format_labels(_labels(labels))} {value}')
+
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    app.before_request(_before_request)
+    app.after_request(_after_request)
@@ -0,0 +1,166 @@
+"""Outbox for outgoing email.
+
+Request handlers call enqueue_email(), which only inserts a document into
+the outbox collection. A background sender claims due messages in batches,
+sends each batch over a single authenticated SMTP connection (Flask-Mail's
+mail.connect()), and records the outcome on the document:
+
+    pending -> sending -> sent
+                       -> pending (retry after OUTBOX_BACKOFF * 2**(attempts - 1))
+                       -> failed  (after OUTBOX_MAX_ATTEMPTS)
+
+Sent and failed messages get finished_at, which a TTL index in schema.py
+uses to remove them after a week.
+
+A message stuck in 'sending' longer than OUTBOX_LEASE_SECONDS (the worker
+died mid-batch) is picked up again.
+
+To try it against a local debugging SMTP server:
+
+    python -m aiosmtpd -n -l localhost:1025
+    MAIL_SERVER=localhost MAIL_PORT=1025 MAIL_USE_TLS=0 python app.py
+"""
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask_mail import Message
+from pymongo import ReturnDocument
+
+from db import outbox_collection
+from extensions.mail import mail
+from utils import metrics
+
+OUTBOX_BATCH_SIZE = 20
+OUTBOX_POLL_INTERVAL = 2
+OUTBOX_MAX_ATTEMPTS = 5
+OUTBOX_BACKOFF = 30
+OUTBOX_LEASE_SECONDS = 300
+
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def enqueue_email(subject, sender, recipients, html=None, body=None):
+    now = datetime.now()
+    result = outbox_collection.insert_one({
+        'subject': subject,
+        'sender': sender,
+        'recipients': list(recipients),
+        'html': html,
+        'body': body,
+        'status': 'pending',
+        'attempts': 0,
+        'created_at': now,
+        'next_attempt_at': now
+    })
+    _wakeup.set()
+    return result.inserted_id
+
+
+def _claim_batch(limit):
+    now = datetime.now()
+    claimed = []
+    while len(claimed) < limit:
+        message = outbox_collection.find_one_and_update(
+            {'$or': [
+                {'status': 'pending', 'next_attempt_at': {'$lte': now}},
+                {'status': 'sending', 'claimed_at': {'$lt': now - timedelta(seconds=OUTBOX_LEASE_SECONDS)}}
+            ]},
+            {'$set': {'status': 'sending', 'claimed_at': now}},
+            sort=[('next_attempt_at', 1)],
+            return_document=ReturnDocument.AFTER
+        )
+        if not message:
+            break
+        claimed.append(message)
+    return claimed
+
+
+def _build_message(message):
+    msg = Message(
+        subject=message['subject'],
+        sender=message['sender'],
+        recipients=message['recipients']
+    )
+    msg.html = message.get('html')
+    msg.body = message.get('body')
+    return msg
+
+
+def _mark_failed(message, error):
+    attempts = message.get('attempts', 0) + 1
+    update = {
+        'attempts': attempts,
+        'last_error': str(error),
+        'claimed_at': None
+    }
+    if attempts >= OUTBOX_MAX_ATTEMPTS:
+        update['status'] = 'failed'
+        update['finished_at'] = datetime.now()
+    else:
+        update['status'] = 'pending'
+        update['next_attempt_at'] = datetime.now() + timedelta(seconds=OUTBOX_BACKOFF * 2 ** (attempts - 1))
+    outbox_collection.update_one({'_id': message['_id']}, {'$set': update})
+
+
+def process_outbox(app, batch_size=OUTBOX_BATCH_SIZE):
+    """Send one batch of due messages. Returns the number sent."""
+    messages = _claim_batch(batch_size)
+    if not messages:
+        return 0
+
+    sent = 0
+    with app.app_context():
+        try:
+            with mail.connect() as connection:
+                for message in messages:
+                    started = time.perf_counter()
+                    try:
+                        connection.send(_build_message(message))
+                    except Exception as e:
+                        print(f"Outbox send error for {message['_id']}: {e}")
+                        _mark_failed(message, e)
+                        metrics.inc('outbox_messages_total', status='failed')
+                        continue
+                    metrics.observe('outbox_send_seconds', time.perf_counter() - started)
+                    metrics.inc('outbox_messages_total', status='sent')
+
+                    now = datetime.now()
+                    outbox_collection.update_one(
+                        {'_id': message['_id']},
+                        {'$set': {'status': 'sent', 'sent_at': now, 'finished_at': now, 'claimed_at': None},
+                         '$inc': {'attempts': 1}}
+                    )
+                    sent += 1
+        except Exception as e:
+            # Connecting or logging in failed: nothing past the last sent one went out
+            print(f"Outbox connection error: {e}")
+            for message in messages:
+                current = outbox_collection.find_one({'_id': message['_id']}, {'status': 1})
+                if current and current['status'] == 'sending':
+                    _mark_failed(message, e)
+
+    return sent
+
+
+def _run_worker(app):
+    while True:
+        try:
+            if process_outbox(app):
+                continue
+        except Exception as e:
+            print(f"Outbox worker error: {e}")
+        _wakeup.wait(OUTBOX_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_outbox_worker(app):
+    global _worker
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run_worker, args=(app,), name='outbox-sender', daemon=True)
+            _worker.start()
+    return _worker
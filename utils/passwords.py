@@ -0,0 +1,121 @@
+"""bcrypt hashing off the request worker.
+
+bcrypt is deliberately slow, and calling it inline on an eventlet/SocketIO
+worker stalls every socket in the process. hash_password / check_password
+run it in real OS threads instead (eventlet's tpool when eventlet has
+patched threading, a ThreadPoolExecutor otherwise), with at most
+PASSWORD_HASH_WORKERS hashes in flight; further callers queue.
+
+BCRYPT_LOG_ROUNDS is the cost factor for new hashes. needs_rehash() lets
+auth_login upgrade (or downgrade) a stored hash after a successful login,
+so the cost can be tuned without a migration.
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+
+from extensions.bcrypt import bcrypt
+
+DEFAULT_WORKERS = 4
+DEFAULT_LOG_ROUNDS = 12
+
+_executor = None
+_slots = None
+_init_lock = threading.Lock()
+
+_stats = {
+    'queued': 0,
+    'active': 0,
+    'completed': 0,
+    'failed': 0,
+    'wait_seconds_total': 0.0,
+    'hash_seconds_total': 0.0
+}
+_stats_lock = threading.Lock()
+
+
+def _eventlet_patched():
+    try:
+        from eventlet import patcher
+    except ImportError:
+        return False
+    return patcher.is_monkey_patched('thread')
+
+
+def _init_pool():
+    global _executor, _slots
+
+    if _slots is not None:
+        return
+
+    with _init_lock:
+        if _slots is not None:
+            return
+        workers = current_app.config.get('PASSWORD_HASH_WORKERS', DEFAULT_WORKERS)
+        if not _eventlet_patched():
+            _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='bcrypt')
+        _slots = threading.BoundedSemaphore(workers)
+
+
+def _record(**deltas):
+    with _stats_lock:
+        for key, delta in deltas.items():
+            _stats[key] += delta
+
+
+def _run(fn, *args):
+    _init_pool()
+
+    queued_at = time.monotonic()
+    _record(queued=1)
+    _slots.acquire()
+    started_at = time.monotonic()
+    _record(queued=-1, active=1, wait_seconds_total=started_at - queued_at)
+
+    try:
+        if _executor is None:
+            from eventlet import tpool
+            result = tpool.execute(fn, *args)
+        else:
+            result = _executor.submit(fn, *args).result()
+        _record(completed=1)
+        return result
+    except Exception:
+        _record(failed=1)
+        raise
+    finally:
+        _slots.release()
+        _record(active=-1, hash_seconds_total=time.monotonic() - started_at)
+
+
+def log_rounds():
+    return current_app.config.get('BCRYPT_LOG_ROUNDS', DEFAULT_LOG_ROUNDS)
+
+
+def hash_password(password):
+    pw_hash = _run(bcrypt.generate_password_hash, password, log_rounds())
+    return pw_hash.decode('utf-8') if isinstance(pw_hash, bytes) else pw_hash
+
+
+def check_password(pw_hash, password):
+    if not pw_hash:
+        return False
+    return _run(bcrypt.check_password_hash, pw_hash, password)
+
+
+def needs_rehash(pw_hash):
+    """True when pw_hash was made with a different cost than BCRYPT_LOG_ROUNDS."""
+    if isinstance(pw_hash, bytes):
+        pw_hash = pw_hash.decode('utf-8')
+    try:
+        # $2b$<rounds>$<salt+hash>
+        return int(pw_hash.split('$')[2]) != log_rounds()
+    except (AttributeError, IndexError, ValueError):
+        return True
+
+
+def password_pool_stats():
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,240 @@
+"""Cascading project deletion in the background.
+
+project_delete only marks the project (deleted_at) and queues a purge job;
+every project query filters on NOT_DELETED, so the project disappears
+straight away. A background worker then removes the project's data in
+PURGE_BATCH_SIZE batches, one phase at a time:
+
+    comments -> tasks -> columns -> tombstones -> recent_views
+             -> stray_tasks -> stray_comments -> stray_recent_views -> project
+
+Other processes may still hold a cached role for the project for up to
+ACCESS_CACHE_TTL seconds (utils.access), and buffered recent views are
+written up to FLUSH_INTERVAL seconds late (utils.recent_views), so rows can
+land after their phase has run. The stray_* phases sweep those up, and a
+job reaching them early is put back with not_before set to the project's
+deleted_at plus that window.
+
+Progress is saved on the job document (jobs collection, _id
+'project_purge_<project_id>') after every batch. Deletes are idempotent,
+so a job left 'running' by a crashed worker is simply claimed again once
+its lease (PURGE_LEASE_SECONDS) runs out and carries on with its phase.
+
+The same worker runs utils.revisions.compact_tombstones() once every
+TOMBSTONE_COMPACT_INTERVAL seconds.
+
+    python -m utils.project_purge run                 # drain pending jobs now
+    python -m utils.project_purge status <project_id>
+"""
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from db import (projects_collection, column_collection, tasks_collection, comments_collection,
+                tombstones_collection, recent_views_collection, jobs_collection)
+from utils.revisions import compact_tombstones
+from utils.recent_views import FLUSH_INTERVAL
+
+PURGE_BATCH_SIZE = 500
+PURGE_POLL_INTERVAL = 5
+PURGE_LEASE_SECONDS = 120
+# Pause between batches so a large purge does not starve request traffic
+PURGE_BATCH_PAUSE = 0.05
+# The worker also compacts old tombstones this often
+TOMBSTONE_COMPACT_INTERVAL = 3600
+
+# Matches projects that are not being deleted
+NOT_DELETED = {'deleted_at': None}
+
+# (phase, collection, field holding the project id)
+PHASES = [
+    ('comments', comments_collection, 'project_id'),
+    ('tasks', tasks_collection, 'project_id'),
+    ('columns', column_collection, 'project'),
+    ('tombstones', tombstones_collection, 'project_id'),
+    ('recent_views', recent_views_collection, 'project_id'),
+    ('stray_tasks', tasks_collection, 'project_id'),
+    ('stray_comments', comments_collection, 'project_id'),
+    ('stray_recent_views', recent_views_collection, 'project_id'),
+]
+FIRST_STRAY_PHASE = 'stray_tasks'
+
+_worker = None
+_worker_lock = threading.Lock()
+_wakeup = threading.Event()
+
+
+def purge_job_id(project_id):
+    return f'project_purge_{project_id}'
+
+
+def deleting_project_ids():
+    """Projects marked deleted whose data is still being purged."""
+    return projects_collection.distinct('_id', {'deleted_at': {'$type': 'date'}})
+
+
+def schedule_project_deletion(project_id, user_id):
+    """Hide the project and queue its purge. Returns False if it was already deleted."""
+    now = datetime.now()
+    result = projects_collection.update_one(
+        {'_id': ObjectId(project_id), **NOT_DELETED},
+        {'$set': {'deleted_at': now, 'deleted_by': user_id, 'status': 'deleted'}}
+    )
+    if not result.modified_count:
+        return False
+
+    jobs_collection.update_one(
+        {'_id': purge_job_id(project_id)},
+        {'$setOnInsert': {
+            'type': 'project_purge',
+            'project_id': ObjectId(project_id),
+            'user_id': user_id,
+            'status': 'pending',
+            'phase': PHASES[0][0],
+            'deleted': {},
+            'deleted_at': now,
+            'created_at': now,
+            'claimed_at': None
+        }},
+        upsert=True
+    )
+    _wakeup.set()
+    return True
+
+
+def purge_status(project_id):
+    return jobs_collection.find_one({'_id': purge_job_id(project_id)})
+
+
+def _claim_job():
+    now = datetime.now()
+    return jobs_collection.find_one_and_update(
+        {'type': 'project_purge', '$or': [
+            {'status': 'pending', 'not_before': None},
+            {'status': 'pending', 'not_before': {'$lte': now}},
+            {'status': 'running', 'claimed_at': {'$lt': now - timedelta(seconds=PURGE_LEASE_SECONDS)}}
+        ]},
+        {'$set': {'status': 'running', 'claimed_at': now, 'not_before': None}},
+        sort=[('created_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def _delete_batch(collection, field, project_id):
+    ids = [doc['_id'] for doc in collection.find({field: project_id}, {'_id': 1}).limit(PURGE_BATCH_SIZE)]
+    if not ids:
+        return 0
+    return collection.delete_many({'_id': {'$in': ids}}).deleted_count
+
+
+def _stray_writes_until(job):
+    """When no late write can reach the project any more."""
+    # Imported here: utils.access imports this module
+    from utils.access import ACCESS_CACHE_TTL
+
+    deleted_at = job.get('deleted_at') or job['created_at']
+    return deleted_at + timedelta(seconds=max(ACCESS_CACHE_TTL, FLUSH_INTERVAL) + PURGE_POLL_INTERVAL)
+
+
+def run_job(job):
+    """Purge one project, resuming from the job's saved phase.
+
+    Returns the job, still 'pending' if it was put back to wait for strays.
+    """
+    project_id = job['project_id']
+    phase_names = [phase for phase, _, _ in PHASES]
+    start = phase_names.index(job['phase']) if job.get('phase') in phase_names else len(PHASES)
+
+    not_before = _stray_writes_until(job)
+    for phase, collection, field in PHASES[start:]:
+        if phase == FIRST_STRAY_PHASE and datetime.now() < not_before:
+            return jobs_collection.find_one_and_update(
+                {'_id': job['_id']},
+                {'$set': {'status': 'pending', 'phase': phase, 'not_before': not_before, 'claimed_at': None}},
+                return_document=ReturnDocument.AFTER
+            )
+
+        while True:
+            deleted = _delete_batch(collection, field, project_id)
+            if not deleted:
+                break
+            # Saving progress also renews the lease
+            jobs_collection.update_one(
+                {'_id': job['_id']},
+                {'$set': {'phase': phase, 'claimed_at': datetime.now(), 'updated_at': datetime.now()},
+                 '$inc': {f'deleted.{phase}': deleted}}
+            )
+            time.sleep(PURGE_BATCH_PAUSE)
+
+        next_phase = phase_names.index(phase) + 1
+        jobs_collection.update_one(
+            {'_id': job['_id']},
+            {'$set': {'phase': phase_names[next_phase] if next_phase < len(PHASES) else 'project',
+                      'claimed_at': datetime.now()}}
+        )
+
+    projects_collection.delete_one({'_id': project_id, 'deleted_at': {'$type': 'date'}})
+    job = jobs_collection.find_one_and_update(
+        {'_id': job['_id']},
+        {'$set': {'status': 'done', 'phase': 'done', 'completed_at': datetime.now(), 'claimed_at': None}},
+        return_document=ReturnDocument.AFTER
+    )
+    print(f"Purged project {project_id}: {job.get('deleted', {})}")
+    return job
+
+
+def process_purges():
+    """Run every due purge job. Returns the number completed."""
+    completed = 0
+    while True:
+        job = _claim_job()
+        if not job:
+            return completed
+        try:
+            if run_job(job)['status'] == 'done':
+                completed += 1
+        except Exception as e:
+            # Left 'running'; claimed again after the lease expires
+            print(f"Project purge error for {job['project_id']}: {e}")
+            return completed
+
+
+def _run_worker():
+    next_compaction = time.monotonic()
+    while True:
+        try:
+            process_purges()
+        except Exception as e:
+            print(f"Project purge worker error: {e}")
+        if time.monotonic() >= next_compaction:
+            next_compaction = time.monotonic() + TOMBSTONE_COMPACT_INTERVAL
+            try:
+                compact_tombstones()
+            except Exception as e:
+                print(f"Tombstone compaction error: {e}")
+        _wakeup.wait(PURGE_POLL_INTERVAL)
+        _wakeup.clear()
+
+
+def start_purge_worker():
+    global _worker
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = threading.Thread(target=_run_worker, name='project-purge', daemon=True)
+            _worker.start()
+    return _worker
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'run':
+        print(f"Completed {process_purges()} purge job(s)")
+    elif len(sys.argv) > 2 and sys.argv[1] == 'status':
+        print(purge_status(sys.argv[2]))
+    else:
+        print("Usage: python -m utils.project_purge run|status <project_id>")
+        sys.exit(2)
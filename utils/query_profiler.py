@@ -0,0 +1,166 @@
+"""Per-request Mongo query profiling.
+
+A pymongo CommandListener (registered on the client in db.py) attributes
+every command run while handling a Flask request to that request: command,
+collection, duration and documents returned. Reply sizes are only measured
+with QUERY_PROFILING_BYTES, since that re-encodes every reply. After the
+request:
+
+- a Server-Timing header reports the count and total time,
+  e.g. `mongo;dur=12.4;desc="7 queries"`, visible in the browser devtools
+- requests over QUERY_BUDGET_COUNT commands or QUERY_BUDGET_MS are logged
+  with their command list (app.logger, warning level)
+- the same command shape (command, collection, filter keys) repeated
+  N_PLUS_ONE_THRESHOLD or more times is logged as an N+1 candidate
+
+Commands from background threads (outbox, flusher, change stream) are not
+attributed to anything and are ignored. Off by default; enable with
+QUERY_PROFILING=1.
+"""
+import threading
+from collections import Counter, defaultdict
+
+import bson
+from flask import current_app, g, has_request_context, request
+from pymongo import monitoring
+
+QUERY_BUDGET_COUNT = 10
+QUERY_BUDGET_MS = 100
+N_PLUS_ONE_THRESHOLD = 3
+
+# Commands that are driver housekeeping, not queries
+IGNORED_COMMANDS = {'endSessions', 'hello', 'isMaster', 'ismaster', 'ping', 'saslStart', 'saslContinue'}
+
+_enabled = False
+_measure_bytes = False
+
+_stats_lock = threading.Lock()
+_endpoint_stats = defaultdict(lambda: {'requests': 0, 'queries': 0, 'duration_ms': 0.0, 'n_plus_one': 0})
+
+
+def _shape(value):
+    """A filter with its values replaced by type names."""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _shape(item)) for key, item in value.items()))
+    if isinstance(value, list):
+        return tuple(_shape(item) for item in value[:1])
+    return type(value).__name__
+
+
+def _command_shape(name, command):
+    if name == 'find':
+        body = command.get('filter')
+    elif name == 'aggregate':
+        body = [list(stage) for stage in command.get('pipeline', [])]
+    elif name in ('update', 'delete'):
+        body = [item.get('q') for item in command.get('updates') or command.get('deletes') or []]
+    elif name == 'findAndModify':
+        body = command.get('query')
+    else:
+        body = None
+    collection = command.get('collection') if name == 'getMore' else command.get(name)
+    return f"{name} {collection} {_shape(body)}"
+
+
+def _returned(reply):
+    cursor = reply.get('cursor')
+    if cursor:
+        return len(cursor.get('firstBatch') or cursor.get('nextBatch') or [])
+    return reply.get('n', 0)
+
+
+class QueryProfiler(monitoring.CommandListener):
+
+    def started(self, event):
+        if not _enabled or event.command_name in IGNORED_COMMANDS or not has_request_context():
+            return
+        pending = g.setdefault('_pending_queries', {})
+        # getMore names the cursor id; the collection is a separate field
+        collection_field = 'collection' if event.command_name == 'getMore' else event.command_name
+        pending[event.request_id] = (
+            event.command_name,
+            event.command.get(collection_field),
+            _command_shape(event.command_name, event.command)
+        )
+
+    def _finish(self, event, reply=None):
+        if not _enabled or not has_request_context():
+            return
+        started = g.get('_pending_queries', {}).pop(event.request_id, None)
+        if started is None:
+            return
+        name, collection, shape = started
+        g.setdefault('_queries', []).append({
+            'command': name,
+            'collection': collection,
+            'shape': shape,
+            'duration_ms': event.duration_micros / 1000,
+            'returned': _returned(reply) if reply is not None else 0,
+            'bytes': len(bson.encode(reply)) if _measure_bytes and reply is not None else None,
+            'failed': reply is None
+        })
+
+    def succeeded(self, event):
+        self._finish(event, event.reply)
+
+    def failed(self, event):
+        self._finish(event)
+
+
+query_profiler = QueryProfiler()
+
+
+def request_queries():
+    """Commands recorded so far for the current request."""
+    return g.get('_queries', [])
+
+
+def query_stats():
+    """{endpoint: {'requests', 'queries', 'duration_ms', 'n_plus_one'}}"""
+    with _stats_lock:
+        return {endpoint: dict(stats) for endpoint, stats in _endpoint_stats.items()}
+
+
+def _report(response):
+    queries = request_queries()
+    total_ms = sum(query['duration_ms'] for query in queries)
+    endpoint = request.endpoint or 'unknown'
+
+    response.headers.add('Server-Timing', f'mongo;dur={total_ms:.1f};desc="{len(queries)} queries"')
+
+    repeated = [
+        (shape, count) for shape, count in Counter(query['shape'] for query in queries).items()
+        if count >= N_PLUS_ONE_THRESHOLD
+    ]
+
+    with _stats_lock:
+        stats = _endpoint_stats[endpoint]
+        stats['requests'] += 1
+        stats['queries'] += len(queries)
+        stats['duration_ms'] += total_ms
+        stats['n_plus_one'] += len(repeated)
+
+    if len(queries) > QUERY_BUDGET_COUNT or total_ms > QUERY_BUDGET_MS:
+        lines = [f"Query budget exceeded on {request.method} {request.path} ({endpoint}): "
+                 f"{len(queries)} queries, {total_ms:.1f} ms"]
+        for query in queries:
+            size = f" {query['bytes']:8} B" if query['bytes'] is not None else ''
+            lines.append(f"    {query['command']:<14} {query['collection']!s:<14} {query['duration_ms']:7.2f} ms "
+                         f"{query['returned']:5} docs{size}")
+        current_app.logger.warning('\n'.join(lines))
+
+    for shape, count in repeated:
+        current_app.logger.warning(f"Possible N+1 on {endpoint}: {count}x {shape}")
+
+    return response
+
+
+def init_query_profiler(app):
+    global _enabled, _measure_bytes, QUERY_BUDGET_COUNT, QUERY_BUDGET_MS
+
+    _enabled = bool(app.config.get('QUERY_PROFILING'))
+    _measure_bytes = bool(app.config.get('QUERY_PROFILING_BYTES'))
+    QUERY_BUDGET_COUNT = app.config.get('QUERY_BUDGET_COUNT', QUERY_BUDGET_COUNT)
+    QUERY_BUDGET_MS = app.config.get('QUERY_BUDGET_MS', QUERY_BUDGET_MS)
+    if _enabled:
+        app.after_request(_report)
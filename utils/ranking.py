@@ -0,0 +1,132 @@
+"""Gapped integer ranks for ordering tasks inside a column.
+
+A task's `order` is an integer and tasks are sorted by (order, _id).
+
+- Appending to a column uses append_rank(), a microsecond timestamp, so it is
+  larger than every rank handed out before it and needs no read of the column.
+- Dropping a card between two others uses rank_between(prev, next), the
+  midpoint of the neighbours' ranks sent by the board.
+- When two neighbours are adjacent (no integer left between them) the column
+  is rebalanced: its tasks are renumbered RANK_GAP apart, ending below the
+  current append_rank() so later appends still land at the bottom.
+
+Old boards numbered tasks 0, 1, 2, ... which already sort before any
+timestamp rank, so no migration is required.
+
+    python -m utils.ranking rebalance <column_id>
+"""
+import sys
+import time
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db import tasks_collection
+
+RANK_GAP = 1 << 16
+
+
+def append_rank():
+    return time.time_ns() // 1000
+
+
+def rank_between(prev_rank=None, next_rank=None):
+    """Return a rank strictly between prev_rank and next_rank.
+
+    Either side may be None for the top or bottom of the column. Returns None
+    when there is no room left and the column has to be rebalanced.
+    """
+    if prev_rank is None and next_rank is None:
+        return append_rank()
+
+    if prev_rank is None:
+        return int(next_rank) - RANK_GAP
+
+    if next_rank is None:
+        return max(append_rank(), int(prev_rank) + 1)
+
+    prev_rank, next_rank = int(prev_rank), int(next_rank)
+    if next_rank - prev_rank < 2:
+        return None
+    return (prev_rank + next_rank) // 2
+
+
+def parse_rank(value):
+    """A rank sent by the board as an int, or None if it was left out.
+
+    Raises ValueError for anything that is not a whole number.
+    """
+    if value is None or value == '':
+        return None
+    if isinstance(value, bool) or isinstance(value, float):
+        raise ValueError(f'Invalid rank: {value!r}')
+    return int(value)
+
+
+def rebalance_placements(column_id, revision=None):
+    """Renumber a column, returning [(task _id, old rank, new rank)] in order."""
+    column_id = ObjectId(column_id)
+    tasks = list(
+        tasks_collection.find({'column_id': column_id}, {'_id': 1, 'order': 1}).sort([('order', 1), ('_id', 1)])
+    )
+
+    top = append_rank() - len(tasks) * RANK_GAP
+    placed = [(task['_id'], task.get('order'), top + index * RANK_GAP) for index, task in enumerate(tasks)]
+
+    if placed:
+        tasks_collection.bulk_write([
+            UpdateOne(
+                {'_id': task_id, 'column_id': column_id},
+                {'$set': {'order': rank, 'revision': revision} if revision else {'order': rank}}
+            )
+            for task_id, _, rank in placed
+        ], ordered=False)
+    return placed
+
+
+def rebalance_column(column_id, revision=None):
+    """Renumber a column's tasks RANK_GAP apart. Returns {task _id: new rank}.
+
+    Pass the project's next revision to have the renumbered tasks show up in
+    /projects/<id>/changes.
+    """
+    return {task_id: rank for task_id, _, rank in rebalance_placements(column_id, revision)}
+
+
+def placement_rank(placed, task_id, old_rank, last):
+    """New rank of a neighbour the board saw at old_rank, after a rebalance."""
+    if task_id and ObjectId.is_valid(task_id):
+        for placed_id, _, rank in placed:
+            if placed_id == ObjectId(task_id):
+                return rank
+    # No neighbour id sent: find the neighbour by the rank the board saw
+    matches = [rank for _, old, rank in placed if old == old_rank]
+    if not matches:
+        return None
+    return matches[-1] if last else matches[0]
+
+
+def resolve_rank(column_id, prev_rank=None, next_rank=None, prev_task_id=None, next_task_id=None, revision=None):
+    """Rank for a drop between two neighbours, rebalancing the column if needed.
+
+    Returns None when the neighbours are no longer in the column after a
+    rebalance, so the drop position cannot be honoured.
+    """
+    rank = rank_between(prev_rank, next_rank)
+    if rank is not None:
+        return rank
+
+    placed = rebalance_placements(column_id, revision)
+    prev_rank = placement_rank(placed, prev_task_id, int(prev_rank), last=True)
+    next_rank = placement_rank(placed, next_task_id, int(next_rank), last=False)
+    if prev_rank is None or next_rank is None:
+        return None
+    return rank_between(prev_rank, next_rank)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == 'rebalance':
+        print(f"Rebalanced {len(rebalance_column(sys.argv[2]))} tasks")
+    else:
+        print("Usage: python -m utils.ranking rebalance <column_id>")
+        sys.exit(2)
@@ -0,0 +1,144 @@
+"""Write-behind buffer for "last viewed" timestamps.
+
+Opening a board used to $set last_viewed.<user_id> on the project document.
+project_view now calls record_view(), which only touches an in-process dict.
+A background thread flushes the buffered timestamps every FLUSH_INTERVAL
+seconds as a single bulk_write into the small recent_views collection
+(one document per user/project), and once more when the process exits.
+
+    python -m utils.recent_views migrate   # move old project.last_viewed maps over
+"""
+import atexit
+import sys
+import threading
+import time
+from datetime import datetime
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from db import projects_collection, recent_views_collection
+
+FLUSH_INTERVAL = 5
+MAX_PENDING = 10000
+
+_pending = {}
+_lock = threading.Lock()
+_flusher = None
+
+
+def record_view(user_id, project_id, viewed_at=None):
+    key = (str(user_id), str(project_id))
+    viewed_at = viewed_at or datetime.now()
+
+    with _lock:
+        if key not in _pending or _pending[key] < viewed_at:
+            _pending[key] = viewed_at
+        overflow = len(_pending) >= MAX_PENDING
+
+    _start_flusher()
+    if overflow:
+        flush()
+
+
+def flush():
+    """Write every buffered timestamp in one bulk_write. Returns the count written."""
+    global _pending
+
+    with _lock:
+        if not _pending:
+            return 0
+        batch, _pending = _pending, {}
+
+    operations = [
+        UpdateOne(
+            {'user_id': user_id, 'project_id': ObjectId(project_id)},
+            {'$max': {'viewed_at': viewed_at}},
+            upsert=True
+        )
+        for (user_id, project_id), viewed_at in batch.items()
+    ]
+
+    try:
+        recent_views_collection.bulk_write(operations, ordered=False)
+    except Exception as e:
+        print(f"Recent views flush error: {e}")
+        # Put the batch back so the next flush retries it, keeping newer views
+        with _lock:
+            for key, viewed_at in batch.items():
+                if key not in _pending or _pending[key] < viewed_at:
+                    _pending[key] = viewed_at
+        return 0
+
+    return len(operations)
+
+
+def last_viewed_by_project(user_id, limit=50):
+    """Map project _id -> last viewed datetime for one user, newest first."""
+    viewed = {}
+    for view in recent_views_collection.find(
+        {'user_id': str(user_id)},
+        {'project_id': 1, 'viewed_at': 1, '_id': 0},
+        sort=[('viewed_at', -1)],
+        limit=limit
+    ):
+        viewed[view['project_id']] = view['viewed_at']
+
+    # Views that have not been flushed yet still count for the viewer
+    with _lock:
+        pending = [(key[1], viewed_at) for key, viewed_at in _pending.items() if key[0] == str(user_id)]
+    for project_id, viewed_at in pending:
+        project_id = ObjectId(project_id)
+        if project_id not in viewed or viewed[project_id] < viewed_at:
+            viewed[project_id] = viewed_at
+
+    return viewed
+
+
+def _flush_loop():
+    while True:
+        time.sleep(FLUSH_INTERVAL)
+        flush()
+
+
+def _start_flusher():
+    global _flusher
+
+    if _flusher is not None:
+        return
+
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(target=_flush_loop, name='recent-views-flusher', daemon=True)
+        _flusher.start()
+
+
+atexit.register(flush)
+
+
+def migrate_project_last_viewed():
+    """Move last_viewed maps off project documents into recent_views."""
+    migrated = 0
+    for project in projects_collection.find({'last_viewed': {'$exists': True}}, {'last_viewed': 1}):
+        operations = [
+            UpdateOne(
+                {'user_id': user_id, 'project_id': project['_id']},
+                {'$max': {'viewed_at': viewed_at}},
+                upsert=True
+            )
+            for user_id, viewed_at in (project.get('last_viewed') or {}).items()
+        ]
+        if operations:
+            recent_views_collection.bulk_write(operations, ordered=False)
+        projects_collection.update_one({'_id': project['_id']}, {'$unset': {'last_viewed': ''}})
+        migrated += 1
+    return migrated
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'migrate':
+        print(f"Migrated last_viewed from {migrate_project_last_viewed()} projects")
+    else:
+        print("Usage: python -m utils.recent_views migrate")
+        sys.exit(2)
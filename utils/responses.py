@@ -0,0 +1,78 @@
+from datetime import datetime, timezone
+
+from bson import ObjectId
+from flask import request, flash, redirect, url_for, jsonify, current_app
+
+
+def wants_json():
+    """True for board clients asking for JSON instead of a redirect.
+
+    Forms still post as usual; the client sends Accept: application/json
+    (or ?format=json) to get the JSON variant of a route.
+    """
+    return request.args.get('format') == 'json' or request.accept_mimetypes.best == 'application/json'
+
+
+def to_json_safe(value):
+    """Plain-JSON copy of a document, for payloads that bypass app.json (Socket.IO)."""
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, dict):
+        return {key: to_json_safe(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [to_json_safe(item) for item in value]
+    return value
+
+
+def board_response(project_id, message=None, category='success', status=200, redirect_to=None, **payload):
+    """Flash and redirect back to the board, or return JSON for delta-sync clients."""
+    if wants_json():
+        body = {'success': status < 400, **payload}
+        if message:
+            body['message'] = message
+        return jsonify(body), status
+
+    if message:
+        flash(message, category)
+    return redirect(redirect_to or url_for('view_project', project_id=project_id))
+
+
+# Authenticated JSON may sit in the browser's cache but must be revalidated
+PRIVATE_JSON_CACHE = 'private, no-cache'
+
+
+def document_etag(*parts):
+    """ETag value from a document's identity and version fields."""
+    return '-'.join(
+        str(int(part.timestamp() * 1000)) if isinstance(part, datetime) else str(part)
+        for part in parts
+    )
+
+
+def _http_time(value):
+    # Stored timestamps are naive local time (datetime.now())
+    return value.astimezone(timezone.utc).replace(microsecond=0) if value else None
+
+
+def is_not_modified(etag, last_modified=None):
+    """True when the request's If-None-Match/If-Modified-Since matches."""
+    if request.if_none_match:
+        # Weak comparison: compressed responses carry W/ tags
+        return request.if_none_match.contains_weak(etag)
+    if last_modified and request.if_modified_since:
+        return _http_time(last_modified) <= request.if_modified_since
+    return False
+
+
+def with_validators(response, etag, last_modified=None):
+    response.set_etag(etag)
+    if last_modified:
+        response.last_modified = _http_time(last_modified)
+    response.headers['Cache-Control'] = PRIVATE_JSON_CACHE
+    return response
+
+
+def not_modified_response(etag, last_modified=None):
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
@@ -0,0 +1,168 @@
+"""Per-project revision numbers for delta sync.
+
+Every write to a project's tasks or columns takes the next value of the
+project's `revision` counter and stamps it on the changed document;
+deletions leave a tombstone carrying the revision instead. A client that
+last saw revision N asks /projects/<id>/changes?since=N and gets back only
+what changed after it.
+
+Taking a revision and writing the document stamped with it are two
+operations, so next_revision() also lists the revision under the
+project's in_flight until release_revision() is called after the write.
+changes_since() reports a watermark just below the oldest revision still
+in flight, so a client never moves past a write it has not seen yet. An
+entry older than REVISION_LEASE_SECONDS (the writer died) is ignored.
+Clients are only ever given that watermark: release_revision() returns it
+for write responses and current_watermark() reads it for page renders.
+
+Tombstones older than TOMBSTONE_RETENTION_DAYS are removed by
+compact_tombstones(), which raises the project's tombstone_floor; a client
+asking for changes from before the floor has to resync.
+
+    python -m utils.revisions compact
+"""
+import sys
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from pymongo import ReturnDocument
+
+from db import projects_collection, tasks_collection, column_collection, tombstones_collection
+
+TASK_FIELDS = {
+    'title': 1, 'description': 1, 'type': 1, 'priority': 1, 'due_date': 1, 'labels': 1,
+    'column_id': 1, 'assigned_to': 1, 'assignee_name': 1, 'assignee_initials': 1,
+    'order': 1, 'comment_count': 1, 'created_at': 1, 'updated_at': 1, 'revision': 1
+}
+COLUMN_FIELDS = {'label': 1, 'color': 1, 'order': 1, 'revision': 1}
+
+REVISION_LEASE_SECONDS = 30
+TOMBSTONE_RETENTION_DAYS = 30
+
+
+def claim_revision(project_id):
+    """Take the project's next revision. Call release_revision() once it is written.
+
+    Returns the project's _id, revision and done_column_id (enough for
+    utils.counters), or None if the project is gone.
+    """
+    return projects_collection.find_one_and_update(
+        {'_id': ObjectId(project_id)},
+        [
+            {'$set': {'revision': {'$add': [{'$ifNull': ['$revision', 0]}, 1]}}},
+            {'$set': {'in_flight': {'$concatArrays': [
+                {'$ifNull': ['$in_flight', []]},
+                [{'revision': '$revision', 'at': datetime.now()}]
+            ]}}}
+        ],
+        projection={'revision': 1, 'done_column_id': 1},
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def next_revision(project_id):
+    project = claim_revision(project_id)
+    return project['revision'] if project else 0
+
+
+def release_revision(project_id, revision, inc=None):
+    """Mark a revision as written, along with any whose writer died.
+
+    inc is the write's utils.counters $inc, applied in the same update.
+    Returns the watermark to hand to the client.
+    """
+    if not revision:
+        return 0
+    expired = datetime.now() - timedelta(seconds=REVISION_LEASE_SECONDS)
+    update = {'$pull': {'in_flight': {'$or': [{'revision': revision}, {'at': {'$lt': expired}}]}}}
+    if inc:
+        update['$inc'] = inc
+    project = projects_collection.find_one_and_update(
+        {'_id': ObjectId(project_id)},
+        update,
+        projection={'revision': 1, 'in_flight': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return _watermark(project) if project else 0
+
+
+def record_deletion(project_id, kind, item_id, revision):
+    tombstones_collection.insert_one({
+        'project_id': ObjectId(project_id),
+        'kind': kind,
+        'item_id': ObjectId(item_id),
+        'revision': revision,
+        'deleted_at': datetime.now()
+    })
+
+
+def _watermark(project):
+    """Highest revision below which every write has landed."""
+    revision = project.get('revision', 0)
+    expired = datetime.now() - timedelta(seconds=REVISION_LEASE_SECONDS)
+    pending = [entry['revision'] for entry in project.get('in_flight', []) if entry['at'] >= expired]
+    return min(min(pending) - 1, revision) if pending else revision
+
+
+def current_watermark(project_id):
+    """The revision a freshly rendered board is up to date with."""
+    project = projects_collection.find_one({'_id': ObjectId(project_id)}, {'revision': 1, 'in_flight': 1})
+    return _watermark(project) if project else 0
+
+
+def changes_since(project_id, since):
+    project_id = ObjectId(project_id)
+    project = projects_collection.find_one({'_id': project_id}, {'revision': 1, 'in_flight': 1, 'tombstone_floor': 1})
+    if not project:
+        return {'revision': 0, 'resync': True}
+    revision = _watermark(project)
+
+    # Nothing to diff against, or its tombstones are gone: the client has to load the whole board
+    if since <= 0 or since > project.get('revision', 0) or since < project.get('tombstone_floor', 0):
+        return {'revision': revision, 'resync': True}
+
+    deleted = {'task': [], 'column': []}
+    for tombstone in tombstones_collection.find(
+        {'project_id': project_id, 'revision': {'$gt': since}},
+        {'kind': 1, 'item_id': 1}
+    ):
+        deleted.setdefault(tombstone['kind'], []).append(tombstone['item_id'])
+
+    return {
+        'revision': revision,
+        'resync': False,
+        'tasks': list(tasks_collection.find(
+            {'project_id': project_id, 'revision': {'$gt': since}},
+            TASK_FIELDS
+        )),
+        'columns': list(column_collection.find(
+            {'project': project_id, 'revision': {'$gt': since}},
+            COLUMN_FIELDS
+        )),
+        'deleted_tasks': deleted['task'],
+        'deleted_columns': deleted['column']
+    }
+
+
+def compact_tombstones(retention_days=TOMBSTONE_RETENTION_DAYS):
+    """Remove old tombstones, raising each project's tombstone_floor first."""
+    cutoff = datetime.now() - timedelta(days=retention_days)
+    removed = 0
+    for group in tombstones_collection.aggregate([
+        {'$match': {'deleted_at': {'$lt': cutoff}}},
+        {'$group': {'_id': '$project_id', 'floor': {'$max': '$revision'}}}
+    ]):
+        projects_collection.update_one({'_id': group['_id']}, {'$max': {'tombstone_floor': group['floor']}})
+        removed += tombstones_collection.delete_many({
+            'project_id': group['_id'],
+            'revision': {'$lte': group['floor']}
+        }).deleted_count
+    return removed
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == 'compact':
+        print(f"Removed {compact_tombstones()} tombstones")
+    else:
+        print("Usage: python -m utils.revisions compact")
+        sys.exit(2)
@@ -0,0 +1,331 @@
+"""Socket.IO setup and project room fan-out.
+
+Clients join the room of the board they have open ('join_project'), and
+route handlers call broadcast_to_project() after a write. Events travel
+through a message bus so every worker process, not just the one that
+handled the request, emits them to its own connected clients:
+
+    SOCKET_BUS = 'inprocess'  single process (and tests); delivery is a direct call
+    SOCKET_BUS = 'mongo'      any number of processes/nodes; events go through a
+                              capped collection that every process tails
+
+broadcast_to_project() does not publish straight away. Events for a room
+are collected for COALESCE_WINDOW seconds, a task_updated superseded by a
+later update or delete of the same task is dropped, and what is left goes
+out as one frame: the original event when only one remains, otherwise a
+single 'board_events' frame carrying the list. A room that piles up more
+than MAX_PENDING_EVENTS in one window gets a single 'board_resync' instead.
+
+Clients whose outgoing queue is longer than MAX_CLIENT_BACKLOG are skipped
+rather than buffered further; once they drain they are sent 'board_resync'
+so they reload the board.
+
+Per-room counters are kept in room_stats().
+"""
+import atexit
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from flask import request, session
+from flask_socketio import SocketIO, join_room, leave_room
+from pymongo import ASCENDING, CursorType
+from pymongo.errors import CollectionInvalid
+
+from db import db
+from utils.access import project_role
+
+SOCKET_EVENTS_COLLECTION = 'socket_events'
+SOCKET_EVENTS_SIZE = 16 * 1024 * 1024
+
+COALESCE_WINDOW = 0.05
+MAX_PENDING_EVENTS = 500
+MAX_CLIENT_BACKLOG = 100
+
+_socketio = None
+_bus = None
+# Set from CHANGE_STREAM_BROADCASTS: route handlers' events are then dropped
+_change_stream_broadcasts = False
+
+def _empty_stats():
+    return {'published': 0, 'delivered': 0, 'received_from_bus': 0, 'coalesced': 0, 'resyncs': 0, 'skipped_slow': 0}
+
+
+_stats_lock = threading.Lock()
+_room_stats = defaultdict(_empty_stats)
+_room_members = defaultdict(set)
+
+_pending_lock = threading.Lock()
+_pending = {}
+# Delivery runs on the bus thread and request threads at once
+_resync_lock = threading.Lock()
+_needs_resync = set()
+
+
+def project_room(project_id):
+    return f'project_{project_id}'
+
+
+def _count(room, key):
+    with _stats_lock:
+        _room_stats[room][key] += 1
+
+
+def room_stats():
+    """{room: {'published', 'delivered', 'received_from_bus', 'coalesced', 'resyncs', 'skipped_slow', 'connected'}}"""
+    with _stats_lock:
+        stats = {room: dict(counts) for room, counts in _room_stats.items()}
+        for room, sids in _room_members.items():
+            stats.setdefault(room, _empty_stats())
+            stats[room]['connected'] = len(sids)
+    return stats
+
+
+def _client_backlog(sid):
+    """Packets waiting to be written to one client, 0 if unknown."""
+    try:
+        server = _socketio.server
+        eio_sid = server.manager.eio_sid_from_sid(sid, '/')
+        return server.eio.sockets[eio_sid].queue.qsize()
+    except Exception:
+        return 0
+
+
+def _deliver(room, event, data):
+    if _socketio is None:
+        return
+
+    with _stats_lock:
+        sids = list(_room_members.get(room, ()))
+
+    slow = []
+    resync = []
+    for sid in sids:
+        if _client_backlog(sid) > MAX_CLIENT_BACKLOG:
+            slow.append(sid)
+            with _resync_lock:
+                _needs_resync.add(sid)
+            _count(room, 'skipped_slow')
+        else:
+            with _resync_lock:
+                if sid not in _needs_resync:
+                    continue
+                _needs_resync.discard(sid)
+            resync.append(sid)
+
+    for sid in resync:
+        _socketio.emit('board_resync', {'reason': 'slow_client'}, to=sid)
+        _count(room, 'resyncs')
+
+    _socketio.emit(event, data, to=room, skip_sid=slow or None)
+    _count(room, 'delivered')
+
+
+class InProcessBus:
+    """Delivers straight to this process's clients."""
+
+    def __init__(self, deliver):
+        self.deliver = deliver
+
+    def start(self):
+        pass
+
+    def publish(self, room, event, data):
+        self.deliver(room, event, data)
+
+
+class MongoBus:
+    """Fan-out between processes through a capped collection.
+
+    Events are delivered locally right away and written to the collection;
+    every other process tails it and delivers them to its own clients.
+    """
+
+    def __init__(self, deliver, collection_name=SOCKET_EVENTS_COLLECTION):
+        self.deliver = deliver
+        self.origin = f'{os.getpid()}-{uuid.uuid4().hex}'
+        self.collection_name = collection_name
+        self.collection = None
+        self._thread = None
+
+    def start(self):
+        try:
+            db.create_collection(self.collection_name, capped=True, size=SOCKET_EVENTS_SIZE)
+        except CollectionInvalid:
+            pass
+        self.collection = db[self.collection_name]
+
+        self._thread = threading.Thread(target=self._tail, name='socket-bus', daemon=True)
+        self._thread.start()
+
+    def publish(self, room, event, data):
+        self.deliver(room, event, data)
+        try:
+            self.collection.insert_one({
+                'origin': self.origin,
+                'room': room,
+                'event': event,
+                'data': data
+            })
+        except Exception as e:
+            print(f"Socket bus publish error: {e}")
+
+    def _tail(self):
+        # Only events published after this process started
+        last = self.collection.find_one(sort=[('$natural', -1)])
+        last_id = last['_id'] if last else None
+
+        while True:
+            try:
+                # ObjectIds from different processes are not ordered, so a
+                # reopened cursor resumes by position: it reads the collection
+                # in insertion order and skips up to the last event seen
+                cursor = self.collection.find(
+                    {}, cursor_type=CursorType.TAILABLE_AWAIT, sort=[('$natural', ASCENDING)]
+                )
+                skipping = last_id is not None
+                while cursor.alive:
+                    for message in cursor:
+                        if skipping:
+                            skipping = message['_id'] != last_id
+                            continue
+                        last_id = message['_id']
+                        if message.get('origin') == self.origin:
+                            continue
+                        _count(message['room'], 'received_from_bus')
+                        self.deliver(message['room'], message['event'], message['data'])
+                    if skipping:
+                        # The last event seen was overwritten while the cursor was closed
+                        print("Socket bus tail error: resume position lost, some events were missed")
+                        skipping = False
+            except Exception as e:
+                print(f"Socket bus tail error: {e}")
+            # A tailable cursor dies when the collection is empty; reopen it
+            time.sleep(1)
+
+
+def _register_handlers(socketio):
+    @socketio.on('join_project')
+    def on_join_project(data):
+        project_id = (data or {}).get('project_id')
+        if not project_role(session.get('user_id'), project_id):
+            return {'success': False, 'message': 'Access denied'}
+
+        room = project_room(project_id)
+        join_room(room)
+        with _stats_lock:
+            _room_members[room].add(request.sid)
+        return {'success': True}
+
+    @socketio.on('leave_project')
+    def on_leave_project(data):
+        room = project_room((data or {}).get('project_id'))
+        leave_room(room)
+        with _stats_lock:
+            _room_members[room].discard(request.sid)
+
+    @socketio.on('disconnect')
+    def on_disconnect():
+        with _stats_lock:
+            for sids in _room_members.values():
+                sids.discard(request.sid)
+        with _resync_lock:
+            _needs_resync.discard(request.sid)
+
+
+def init_socketio(app):
+    global _socketio, _bus, _change_stream_broadcasts
+
+    _socketio = SocketIO(app)
+    _register_handlers(_socketio)
+    _change_stream_broadcasts = app.config.get('CHANGE_STREAM_BROADCASTS', False)
+
+    if app.config.get('SOCKET_BUS', 'inprocess') == 'mongo':
+        _bus = MongoBus(_deliver)
+    else:
+        _bus = InProcessBus(_deliver)
+    _bus.start()
+
+    return _socketio
+
+
+def get_socketio():
+    return _socketio
+
+
+def _task_key(event, data):
+    if event in ('task_updated', 'task_deleted'):
+        return data.get('taskId')
+    return None
+
+
+def broadcast_to_project(project_id, event, data, local=False):
+    """Queue an event for everyone watching the project's board.
+
+    local=True only reaches clients connected to this process, for
+    producers that already run once per process (the change stream watcher).
+    When the change stream broadcasts, every other call is a no-op so clients
+    do not get each change twice.
+    """
+    if _change_stream_broadcasts and not local:
+        return
+
+    room = project_room(project_id)
+    _count(room, 'published')
+    key = (room, local)
+
+    with _pending_lock:
+        events = _pending.get(key)
+        if events is None:
+            events = _pending[key] = []
+            timer = threading.Timer(COALESCE_WINDOW, _flush_room, args=key)
+            timer.daemon = True
+            timer.start()
+
+        task_id = _task_key(event, data)
+        if task_id:
+            # An update is superseded by any later update or delete of the same task
+            before = len(events)
+            events[:] = [
+                queued for queued in events
+                if not (queued[0] == 'task_updated' and _task_key(*queued) == task_id)
+            ]
+            if len(events) < before:
+                _count(room, 'coalesced')
+
+        # Past the cap the window will end in a resync, so stop buffering
+        if len(events) <= MAX_PENDING_EVENTS:
+            events.append((event, data))
+
+
+def _flush_room(room, local=False):
+    with _pending_lock:
+        events = _pending.pop((room, local), [])
+
+    if not events or _bus is None:
+        return
+
+    publish = _deliver if local else _bus.publish
+    if len(events) > MAX_PENDING_EVENTS:
+        _count(room, 'resyncs')
+        publish(room, 'board_resync', {'reason': 'too_many_events', 'dropped': len(events)})
+    elif len(events) == 1:
+        publish(room, *events[0])
+    else:
+        publish(room, 'board_events', {
+            'events': [{'event': event, 'data': data} for event, data in events]
+        })
+
+
+def flush_broadcasts():
+    """Publish everything still waiting in the coalescing window."""
+    with _pending_lock:
+        keys = list(_pending)
+    for room, local in keys:
+        _flush_room(room, local)
+
+
+# Events still inside a coalescing window would otherwise be lost on shutdown
+atexit.register(flush_broadcasts)